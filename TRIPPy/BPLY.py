@@ -32,9 +32,11 @@ def BPLY(temp, place=(1.87,0,.157277), angle=(0,.17453+old_div(scipy.pi,2),-1.62
     diodes[-1].redefine(temp)
     return diodes
 
-def BPLYbeam(alcator):
+def BPLYbeam(alcator, cache=None):
 
     temp = BPLY(alcator)
+    if not cache is None:
+        return beamin.cachedBeam(temp[:-1], temp[-1], alcator, cache)
     beams = beamin.multiBeam(temp[:-1],temp[-1])
     alcator.trace(beams)
     return beams
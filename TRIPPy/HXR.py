@@ -52,8 +52,10 @@ def HXR(origin, place = (1.87,-.03,0.), angle=(0.,0.,0.)):
 
     return output
 
-def HXRbeam(alcator):
+def HXRbeam(alcator, cache=None):
     temp = HXR(alcator)
+    if not cache is None:
+        return beam.cachedBeam(temp[:-1], temp[-1], alcator, cache)
     beams = beam.multiBeam(temp[:-1],temp[-1])
     alcator.trace(beams)
     return beams
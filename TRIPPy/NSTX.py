@@ -21,8 +21,10 @@ def diode1(temp,place=(2.0,0,-4e-1), angle=(0,old_div(scipy.pi,2),0)):
     diodes[-1].redefine(temp)
     return diodes
 
-def NSTXsightlines(diodefn, plasma):
+def NSTXsightlines(diodefn, plasma, cache=None):
     temp = diodefn(plasma)
+    if not cache is None:
+        return beam.cachedBeam(temp[:-1], temp[-1], plasma, cache)
     output = beam.multiBeam(temp[:-1],temp[-1])
     plasma.trace(output)
     return output
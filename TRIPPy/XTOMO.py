@@ -37,8 +37,10 @@ def XTOMO1(temp, place1=(0.73674,0.,0.46479), place2=(.747,0.,.4947), angle=(0.,
     diodes[-1].redefine(temp)
     return diodes
 
-def XTOMO1beam(plasma):
+def XTOMO1beam(plasma, cache=None):
     temp = XTOMO1(plasma)
+    if not cache is None:
+        return beam.cachedBeam(temp[:-1], temp[-1], plasma, cache)
     output = beam.multiBeam(temp[:-1],temp[-1])
     plasma.trace(output)
     return output
@@ -88,8 +90,10 @@ def XTOMO3(temp, place=(1.0152,0.,0.),angle =(0.,old_div(scipy.pi,2.),old_div(sc
     diodes[-1].redefine(temp)
     return diodes
 
-def XTOMO3beam(plasma):
+def XTOMO3beam(plasma, cache=None):
     temp = XTOMO3(plasma)
+    if not cache is None:
+        return beam.cachedBeam(temp[:-1], temp[-1], plasma, cache)
     output = beam.multiBeam(temp[:-1],temp[-1])
     plasma.trace(output)
     return output
@@ -124,11 +128,14 @@ def XTOMO5(temp, place=(.8888,0,-.2794),angle =(0.,.79587,old_div(scipy.pi,2.)))
     diodes[-1].redefine(temp)
     return diodes
 
-def XTOMO5beam(plasma):
+def XTOMO5beam(plasma, cache=None):
     temp = XTOMO5(plasma)
-    output = beam.multiBeam(temp[:-1],temp[-1])
-    traceout = 2*scipy.ones((len(output),),dtype=int)
+    traceout = 2*scipy.ones((len(temp)-1,),dtype=int)
     traceout[-3:] = 0
+    if not cache is None:
+        return beam.cachedBeam(temp[:-1], temp[-1], plasma, cache, limiter=traceout)
+
+    output = beam.multiBeam(temp[:-1],temp[-1])
     for i in range(len(output)):
         plasma.trace(output[i],
                      limiter=traceout[i])
@@ -1,4 +1,29 @@
 #include <math.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+/* runtime control of the number of OpenMP threads, which are ignored */
+/* (and a single thread reported) if compiled without OpenMP          */
+
+void set_num_threads(int num)
+{
+#ifdef _OPENMP
+  if(num > 0)
+    {
+      omp_set_num_threads(num);
+    }
+#endif
+}
+
+void get_num_threads(int num[])
+{
+#ifdef _OPENMP
+  *num = omp_get_max_threads();
+#else
+  *num = 1;
+#endif
+}
 
 void intercept2d(double outval[], double pt1[3], double pt2[3], double outliner[], double outlinez[], int ix)
 { 
@@ -34,16 +59,89 @@ void intercept2d(double outval[], double pt1[3], double pt2[3], double outliner[
     }
 }
 
+static double interceptSegment(double pt0[3], double norm[3], double A0, double B0, double C0, double outliner[], double outlinez[], double stemp)
+{
+  /* parabolic intercept of a line with the cone generated by the */
+  /* wall segment outliner[0:2], outlinez[0:2], returns the smaller */
+  /* of the intercept and stemp */
+
+  /* initialize variables */
+  double A,B,C,delr,delz,temp,s1,s2,res=1e-6;
+
+  A = 0;
+  B = 0;
+  C = 0;
+	  
+  delr = outliner[1] - outliner[0];
+  delz = outlinez[1] - outlinez[0];
+	  
+  if(delz)
+    {
+      temp = outliner[0] + (delr/delz)*(pt0[2] - outlinez[0]);
+	      
+      A = A0 - pow((delr/delz)*norm[2],2);
+      B = B0 - 2*temp*(delr/delz)*norm[2];
+      C = C0 - pow(temp,2);
+	      
+    }
+  else if((norm[2] != 0) & (delr != 0)) /* if is not a purely radial line, and points actually a line */
+    { 
+      /*prevents rest of quadratic iteration from occuring */
+      s1 = (outlinez[0] - pt0[2])/norm[2];
+      temp = (sqrt(pow(pt0[0] + norm[0]*s1,2) + pow(pt0[1] + norm[1]*s1,2)) - outliner[0])/delr;
+	      
+      if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
+	{
+	  stemp = s1;
+	} 
+    }
+	  
+  if(A) /*the quadratic form*/
+    {
+      temp = B*B - 4*A*C; /*reuse a variable, not exactly a good idea */
+      if(temp >= 0) /* if there is an intercept */
+	{
+	  temp = sqrt(temp);
+	  s1 = -.5*(temp + B)/A;
+	  s2 = .5*(temp - B)/A;
+	  temp = (s1*norm[2] + (pt0[2] - outlinez[0]))/delz; /*length along cylinder parameterization of intercept */
+	  if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
+	    {
+	      stemp = s1;
+	    }
+		  
+	  temp = (s2*norm[2] + (pt0[2] - outlinez[0]))/delz; /*length along cylinder parameterization of intercept */
+	  if((temp > 0) & (temp <= 1) & (s2 < stemp) & (s2 > res))
+	    {
+	      stemp = s2;
+	    }
+		  
+	}
+    }
+  else if((B != 0) & (C != 0)) /*for directly radial views */
+    {
+      s1 = -B/C;
+      temp = (s1*norm[2] + (pt0[2] - outlinez[0]))/delz; /*length along cylinder parameterization of intercept */
+      if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
+	{
+	  stemp = s1;
+	}
+    }
+
+  return stemp;
+}
+
 void interceptCyl(double s[], double pt0[][3], double norm[][3], double outliner[], double outlinez[], int ix, int jx)
 { 
   /* parabolic intercepts of lines using quadratic formula */
 
   /* initialize variables */
   int i,j;
-  double A,A0,B,B0,C,C0,delr,delz,temp,s1,s2,stemp,res=1e-6;
+  double A0,B0,C0,stemp;
 
- 
-  for(j=jx;j--;)
+  /* rays are independent, and are split amongst threads */
+#pragma omp parallel for private(i,A0,B0,C0,stemp) schedule(static)
+  for(j=0;j < jx;j++)
     {
 
       stemp = INFINITY;
@@ -52,67 +150,258 @@ void interceptCyl(double s[], double pt0[][3], double norm[][3], double outliner
       B0 = 2*(pt0[j][0]*norm[j][0]+pt0[j][1]*norm[j][1]);
       A0 = pow(norm[j][0],2) + pow(norm[j][1],2);
       
-      for(i= ix;i--;)
+      /* ix points define ix-1 segments of the outline */
+      for(i= ix-1;i--;)
 	{
-	  A = 0;
-	  B = 0;
-	  C = 0;
-	  
-	  delr = outliner[i+1] - outliner[i];
-	  delz = outlinez[i+1] - outlinez[i];
-	  
-	  if(delz)
+	  stemp = interceptSegment(pt0[j], norm[j], A0, B0, C0, &outliner[i], &outlinez[i], stemp);
+	}
+
+      s[j]= stemp;
+    }
+
+}
+
+void interceptCylBin(double s[], int seg[], double pt0[][3], double norm[][3], double outliner[], double outlinez[], int binptr[], int binidx[], double zbin[], int ix, int jx, int kx, int lx)
+{ 
+  /* identical to interceptCyl, but only tests the wall segments binned */
+  /* in Z (binidx[binptr[k]:binptr[k+1]] for the kx uniform bins with  */
+  /* edges zbin) between the ray origin and the current intercept. The  */
+  /* index of the intercepted segment is returned in seg (-1 if none)   */
+
+  /* initialize variables */
+  int i,j,k,step;
+  double A0,B0,C0,stemp,temp,near,eps;
+
+  /* tolerance for rounding of the intercept position */
+  eps = 1e-9*(fabs(zbin[0]) + fabs(zbin[kx]) + zbin[kx] - zbin[0]);
+
+#pragma omp parallel for private(i,k,step,A0,B0,C0,stemp,temp,near) schedule(static)
+  for(j=0;j < jx;j++)
+    {
+
+      stemp = INFINITY;
+      seg[j] = -1;
+      
+      C0 = pow(pt0[j][0],2) + pow(pt0[j][1],2);
+      B0 = 2*(pt0[j][0]*norm[j][0]+pt0[j][1]*norm[j][1]);
+      A0 = pow(norm[j][0],2) + pow(norm[j][1],2);
+
+      /* bin of the ray origin */
+      k = (int) floor((pt0[j][2] - zbin[0])/(zbin[1] - zbin[0]));
+      if(k < 0)
+	{
+	  k = 0;
+	}
+      else if(k > kx - 1)
+	{
+	  k = kx - 1;
+	}
+
+      if(norm[j][2] == 0)
+	{
+	  /* a horizontal ray only intercepts segments of its bin, or a neighbouring */
+	  /* bin if it lies on the edge */
+	  step = k + 1;
+	  for(k = k - 1; k <= step; k++)
 	    {
-	      temp = outliner[i] + (delr/delz)*(pt0[j][2] - outlinez[i]);
-	      
-	      A = A0 - pow((delr/delz)*norm[j][2],2);
-	      B = B0 - 2*temp*(delr/delz)*norm[j][2];
-	      C = C0 - pow(temp,2);
-	      
-	    }
-	  else if((norm[j][2] != 0) & (delr != 0)) /* if is not a purely radial line, and points actually a line */
-	    { 
-	      /*prevents rest of quadratic iteration from occuring */
-	      s1 = (outlinez[i] - pt0[j][2])/norm[j][2];
-	      temp = (sqrt(pow(pt0[j][0] + norm[j][0]*s1,2) + pow(pt0[j][1] + norm[j][1]*s1,2)) - outliner[i])/delr;
-	      
-	      if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
+	      if((k >= 0) && (k < kx) && (pt0[j][2] >= zbin[k] - eps) && (pt0[j][2] <= zbin[k+1] + eps))
 		{
-		  stemp = s1;
-		} 
+		  for(i = binptr[k]; i < binptr[k+1]; i++)
+		    {
+		      temp = interceptSegment(pt0[j], norm[j], A0, B0, C0, &outliner[binidx[i]], &outlinez[binidx[i]], stemp);
+		      if(temp < stemp)
+			{
+			  stemp = temp;
+			  seg[j] = binidx[i];
+			}
+		    }
+		}
 	    }
-	  
-	  if(A) /*the quadratic form*/
+	}
+      else
+	{
+	  step = (norm[j][2] > 0) ? 1 : -1;
+	  for(; (k >= 0) & (k < kx); k += step)
 	    {
-	      temp = B*B - 4*A*C; /*reuse a variable, not exactly a good idea */
-	      if(temp >= 0) /* if there is an intercept */
+	      /* intercepts in this and further bins are beyond the near edge */
+	      near = (step > 0) ? zbin[k] : zbin[k+1];
+	      if(step*(near - pt0[j][2]) - eps > stemp*fabs(norm[j][2]))
 		{
-		  temp = sqrt(temp);
-		  s1 = -.5*(temp + B)/A;
-		  s2 = .5*(temp - B)/A;
-		  temp = (s1*norm[j][2] + (pt0[j][2] - outlinez[i]))/delz; /*length along cylinder parameterization of intercept */
-		  if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
-		    {
-		      stemp = s1;
-		    }
-		  
-		  temp = (s2*norm[j][2] + (pt0[j][2] - outlinez[i]))/delz; /*length along cylinder parameterization of intercept */
-		  if((temp > 0) & (temp <= 1) & (s2 < stemp) & (s2 > res))
+		  break;
+		}
+
+	      for(i = binptr[k]; i < binptr[k+1]; i++)
+		{
+		  temp = interceptSegment(pt0[j], norm[j], A0, B0, C0, &outliner[binidx[i]], &outlinez[binidx[i]], stemp);
+		  if(temp < stemp)
 		    {
-		      stemp = s2;
+		      stemp = temp;
+		      seg[j] = binidx[i];
 		    }
-		  
 		}
 	    }
-	  else if((B != 0) & (C != 0)) /*for directly radial views */
+	}
+
+      s[j]= stemp;
+    }
+
+}
+
+static double interceptTriangle(double pt0[3], double norm[3], double vert0[3], double vert1[3], double vert2[3], double stemp)
+{
+  /* Moller-Trumbore intercept of a line with the triangle vert0, vert1, */
+  /* vert2, returns the smaller of the intercept and stemp */
+
+  /* initialize variables */
+  int i;
+  double e1[3],e2[3],t[3],p[3],q[3],det,u,v,s1,res=1e-6;
+
+  for(i=0;i < 3;i++)
+    {
+      e1[i] = vert1[i] - vert0[i];
+      e2[i] = vert2[i] - vert0[i];
+      t[i] = pt0[i] - vert0[i];
+    }
+
+  p[0] = norm[1]*e2[2] - norm[2]*e2[1];
+  p[1] = norm[2]*e2[0] - norm[0]*e2[2];
+  p[2] = norm[0]*e2[1] - norm[1]*e2[0];
+
+  det = e1[0]*p[0] + e1[1]*p[1] + e1[2]*p[2];
+  if(det == 0) /* parallel to the plane of the triangle */
+    {
+      return stemp;
+    }
+
+  u = (t[0]*p[0] + t[1]*p[1] + t[2]*p[2])/det;
+  if((u < 0) || (u > 1))
+    {
+      return stemp;
+    }
+
+  q[0] = t[1]*e1[2] - t[2]*e1[1];
+  q[1] = t[2]*e1[0] - t[0]*e1[2];
+  q[2] = t[0]*e1[1] - t[1]*e1[0];
+
+  v = (norm[0]*q[0] + norm[1]*q[1] + norm[2]*q[2])/det;
+  if((v < 0) || (u + v > 1))
+    {
+      return stemp;
+    }
+
+  s1 = (e2[0]*q[0] + e2[1]*q[1] + e2[2]*q[2])/det;
+  if((s1 < stemp) & (s1 > res))
+    {
+      stemp = s1;
+    }
+
+  return stemp;
+}
+
+void interceptMesh(double s[], int tri[], double pt0[][3], double norm[][3], double vert[][3], int face[][3], int cellptr[], int cellidx[], double lower[3], double width[3], int ncell[3], int ix, int jx, int kx, int lx, int mx)
+{
+  /* intercept of lines with a triangle mesh (vertices vert, faces face),  */
+  /* where the triangles overlapping each cell of a uniform cartesian grid */
+  /* (lower corner lower, cell size width, ncell cells) are listed in      */
+  /* cellidx[cellptr[c]:cellptr[c+1]]. The cells are walked along the ray  */
+  /* until the nearest intercept lies within the current cell. The index  */
+  /* of the intercepted triangle is returned in tri (-1 if none)          */
+
+  /* initialize variables */
+  int i,j,k,a,cell[3],step[3];
+  double stemp,temp,tmin,tmax,t1,t2,texit,tnext[3],tdelta[3];
+
+#pragma omp parallel for private(i,k,a,cell,step,stemp,temp,tmin,tmax,t1,t2,texit,tnext,tdelta) schedule(dynamic,64)
+  for(j=0;j < jx;j++)
+    {
+
+      stemp = INFINITY;
+      tri[j] = -1;
+
+      /* clip the ray to the grid */
+      tmin = 0;
+      tmax = INFINITY;
+      for(a=0;a < 3;a++)
+	{
+	  if(norm[j][a] != 0)
+	    {
+	      t1 = (lower[a] - pt0[j][a])/norm[j][a];
+	      t2 = (lower[a] + ncell[a]*width[a] - pt0[j][a])/norm[j][a];
+	      tmin = fmax(tmin, fmin(t1, t2));
+	      tmax = fmin(tmax, fmax(t1, t2));
+	    }
+	  else if((pt0[j][a] < lower[a]) || (pt0[j][a] > lower[a] + ncell[a]*width[a]))
+	    {
+	      tmax = -INFINITY;
+	    }
+	}
+
+      if(tmin > tmax)
+	{
+	  s[j] = stemp;
+	  continue;
+	}
+
+      /* setup of the cell walk from the grid entry point */
+      for(a=0;a < 3;a++)
+	{
+	  cell[a] = (int) floor((pt0[j][a] + norm[j][a]*tmin - lower[a])/width[a]);
+	  if(cell[a] < 0)
 	    {
-	      s1 = -B/C;
-	      temp = (s1*norm[j][2] + (pt0[j][2] - outlinez[i]))/delz; /*length along cylinder parameterization of intercept */
-	      if((temp > 0) & (temp <= 1) & (s1 < stemp) & (s1 > res))
+	      cell[a] = 0;
+	    }
+	  else if(cell[a] > ncell[a] - 1)
+	    {
+	      cell[a] = ncell[a] - 1;
+	    }
+
+	  if(norm[j][a] != 0)
+	    {
+	      step[a] = (norm[j][a] > 0) ? 1 : -1;
+	      tnext[a] = (lower[a] + (cell[a] + (step[a] > 0))*width[a] - pt0[j][a])/norm[j][a];
+	      tdelta[a] = width[a]/fabs(norm[j][a]);
+	    }
+	  else
+	    {
+	      step[a] = 0;
+	      tnext[a] = INFINITY;
+	      tdelta[a] = INFINITY;
+	    }
+	}
+
+      while(1)
+	{
+	  k = (cell[0]*ncell[1] + cell[1])*ncell[2] + cell[2];
+	  for(i = cellptr[k]; i < cellptr[k+1]; i++)
+	    {
+	      temp = interceptTriangle(pt0[j],
+				       norm[j],
+				       vert[face[cellidx[i]][0]],
+				       vert[face[cellidx[i]][1]],
+				       vert[face[cellidx[i]][2]],
+				       stemp);
+	      if(temp < stemp)
 		{
-		  stemp = s1;
+		  stemp = temp;
+		  tri[j] = cellidx[i];
 		}
 	    }
+
+	  /* intercepts in further cells are beyond the exit of this cell */
+	  a = (tnext[0] < tnext[1]) ? 0 : 1;
+	  a = (tnext[a] < tnext[2]) ? a : 2;
+	  texit = tnext[a];
+	  if((stemp <= texit) || (texit > tmax))
+	    {
+	      break;
+	    }
+
+	  cell[a] += step[a];
+	  if((cell[a] < 0) || (cell[a] > ncell[a] - 1))
+	    {
+	      break;
+	    }
+	  tnext[a] += tdelta[a];
 	}
 
       s[j]= stemp;
@@ -128,6 +417,7 @@ void lineCirc(double out[][5], double pt0[3], double norm[3], double r[], double
   f1r = pow(norm[0],2) + pow(norm[1],2);
   eps = pt0[0]*norm[0] + pt0[1]*norm[1];
 
+#pragma omp parallel for private(epst) schedule(static) if(ix > 1000)
   for(i=0;i < ix; i++)
     { 
       epst = eps + (pt0[2] - z[i])*norm[2];
@@ -148,33 +438,38 @@ void bessel_fourier_kernel(double theta[], double m, double zero, double rho, do
     }
 }
 
-void idx_add(double output[], int idx1[], int idx2[], double data[], double mult[], double ds, int lim2, int ix, int jx1, int jx2)
-{ int i,j,lim1 = 0;
+void idx_add(double output[], int idx1[], int idx2[], double data[], double mult[], double ds, int lim, int ix, int jx1, int jx2)
+{ int i,j,lim1,lim2;
 
+  /* each row (time) of output is only modified by the same row of the */
+  /* inputs, such that rows are split amongst threads with the order of */
+  /* the summation within a row unchanged                               */
+#pragma omp parallel for private(j,lim1,lim2) schedule(static)
   for(i=0; i < ix; i++)
     {
+      lim1 = i*jx1;
+      lim2 = lim + i*jx2;
       for(j=0; j < jx1; j++)
 	{
 	  output[lim2 + idx1[lim1 + j]] = output[lim2 + idx1[lim1 + j]] + mult[lim1 + j]*(ds - data[lim1 + j]);
 	  output[lim2 + idx2[lim1 + j]] = output[lim2 + idx2[lim1 + j]] + mult[lim1 + j]*data[lim1 + j];
 	}
-      lim1 = lim1 + jx1;
-      lim2 = lim2 + jx2;
     }
 }
 
 
 void idx_add2(double output[], int idx1[], int idx2[], double data[], double mult[], double ds, int ix, int jx1, int jx2)
-{ int i,j,lim1 = 0,lim2 = 0;
+{ int i,j,lim1,lim2;
 
+#pragma omp parallel for private(j,lim1,lim2) schedule(static)
   for(i=0; i < ix; i++)
     {
+      lim1 = i*jx1;
+      lim2 = i*jx2;
       for(j=0; j < jx1; j++)
 	{
 	  output[lim2 + idx1[lim1 + j]] = output[lim2 + idx1[lim1 + j]] + mult[lim1 + j]*data[lim1 + j];
 	  output[lim2 + idx2[lim1 + j]] = output[lim2 + idx2[lim1 + j]] + mult[lim1 + j]*(ds - data[lim1 + j]);
 	}
-      lim1 = lim1 + jx1;
-      lim2 = lim2 + jx2;
     }
 }
@@ -7,6 +7,12 @@ from . import geometry
 from . import surface
 import scipy
 import scipy.linalg
+import scipy.sparse
+import numpy.linalg
+import warnings
+import os
+import hashlib
+import tempfile
 from . import _beam
 
 class Ray(geometry.Point):
@@ -144,33 +150,24 @@ class Ray(geometry.Point):
             the bounds of the vacuum vessel/limiter.
 
         Returns:
-            numpy array of s values in meters
+            numpy array of s values in meters, nan where no solution
+            is found.
         """
         r = scipy.atleast_1d(r)
         z = scipy.atleast_1d(z)
-        params = _beam.lineCirc(self(0).x(),
-                                self.norm.unit,
-                                r,
-                                z)
-
-        sout = scipy.zeros(r.shape)
-
-        for i in range(len(params)):
-            temp = scipy.roots(params[i])
-
-            # only positive real solutions are taken
-            temp = temp[scipy.imag(temp) == 0]
-            temp = scipy.real(temp[temp > 0])
-
-            test = self(temp).r()
-            if not trace:
-                # must decide between local and global minima
-                sout[i] = temp[((test[0]-r[i])**2 
-                                + (test[2] - z[i])**2).argmin()]
-            else:
-                #need to implement this such that it searches only in area of interest
-                sout[i] = temp[scipy.logical_and(temp > self.norm.s[-2],
-                                                 temp < self.norm.s[-1])].min()
+        temp = _lineCircRoots(self(0).x(),
+                              self.norm.unit,
+                              r,
+                              z)
+
+        if not trace:
+            # must decide between local and global minima
+            sout = _minDist(self, temp, r, z)
+        else:
+            #need to implement this such that it searches only in area of interest
+            temp[scipy.logical_not(scipy.logical_and(temp > self.norm.s[-2],
+                                                     temp < self.norm.s[-1]))] = scipy.nan
+            sout = _nanSelect(temp, scipy.argmin(scipy.where(scipy.isnan(temp), scipy.inf, temp), axis=1))
 
         return sout
    
@@ -197,26 +194,60 @@ class Ray(geometry.Point):
             neworigin: Origin or Origin-derived object
         """
 
-        lca = self._lca(neworigin)
-        self._rotate(lca, neworigin)
-        super(Ray,self)._translate(lca, neworigin)
+        trans = self._transform(neworigin)
+        self._rotate(trans, neworigin)
+        super(Ray,self)._translate(trans, neworigin)
 
-    def _rotate(self, lca, neworigin):
+    def _rotate(self, trans, neworigin):
         """ rotates the fundamental vectors of the space"""
-        org = lca[0]
-        orgnew = lca[1]
+        self.norm = geometry._rotate(trans, self.norm)
 
-        temp1 = self.norm
+def _lineCircRoots(pt0, norm, r, z):
+    """Real positive roots of the quartics generated by _beam.lineCirc
 
-        for idx in range(len(org)-1,-1,-1):
-            # change the _rot coordinates to accurately reflect all of the necessary variation.
-            temp1 = org[idx].rot(temp1)
+    All roots are found at once from the eigenvalues of the stacked
+    companion matrices, constructed as in scipy.roots.
 
-        for idx in range(len(orgnew)):
-            # the arot allows for translating into the current coordinate system
-            temp1 = orgnew[idx].arot(temp1)
+    Returns:
+        numpy array of shape (len(r), 4) of s values in meters, where
+        complex and non-positive roots are set to nan.
+    """
+    params = _beam.lineCirc(pt0, norm, r, z)
+
+    # strip leading zeros common to all rows (such as vertical rays)
+    while params.shape[1] > 1 and not params[:,0].any():
+        params = params[:,1:]
 
-        self.norm = temp1
+    deg = params.shape[1] - 1
+    if not deg:
+        return scipy.nan*scipy.zeros((len(params), 1))
+    
+    comp = scipy.zeros((len(params), deg, deg))
+    comp[:,1:,:-1] = scipy.eye(deg - 1)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        comp[:,0,:] = -params[:,1:]/params[:,:1]
+        comp[~scipy.isfinite(comp)] = 0.
+
+    # numpy.linalg.eigvals operates on stacks of matrices
+    temp = numpy.linalg.eigvals(comp)
+
+    # only positive real solutions are taken
+    return scipy.where(scipy.logical_and(scipy.imag(temp) == 0,
+                                         scipy.real(temp) > 0),
+                       scipy.real(temp),
+                       scipy.nan)
+
+def _minDist(ray, temp, r, z):
+    """ select the root of each row of temp which minimizes the distance
+    of the ray to the circle (r,z)"""
+    test = ray(temp).r()
+    dist = (test[0] - r[:,scipy.newaxis])**2 + (test[2] - z[:,scipy.newaxis])**2
+    return _nanSelect(temp, scipy.argmin(scipy.where(scipy.isnan(dist), scipy.inf, dist), axis=1))
+
+def _nanSelect(temp, idx):
+    """ select temp[i,idx[i]] for each row"""
+    return temp[scipy.arange(len(temp)), idx]
 
 # generate necessary beams for proper inversion (including etendue, etc)
 class Beam(geometry.Origin):
@@ -382,33 +413,22 @@ class Beam(geometry.Origin):
             the bounds of the vacuum vessel/limiter.
 
         Returns:
-            numpy array of s values in meters
+            numpy array of s values in meters, nan where no solution
+            is found.
         """
         r = scipy.atleast_1d(r)
         z = scipy.atleast_1d(z)
-        params = _beam.lineCirc(self(0).x(),
-                                self.norm.unit,
-                                r,
-                                z)
+        temp = _lineCircRoots(self(0).x(),
+                              self.norm.unit,
+                              r,
+                              z)
 
-        sout = scipy.zeros(r.shape)
-
-        for i in range(len(params)):
-            temp = scipy.roots(params[i])
-
-            # only positive real solutions are taken
-            temp = temp[scipy.imag(temp) == 0]
-            temp = scipy.real(temp[temp > 0])
-
-            test = self(temp).r()
-            
-            # must decide between local and global minima
-            sout[i] = temp[((test[0]-r[i])**2 
-                            + (test[2] - z[i])**2).argmin()]
+        # must decide between local and global minima
+        sout = _minDist(self, temp, r, z)
             
-            if trace and ((sout[i] > self.norm.s[-1]) or (sout[i] < self.norm.s[-2])):
-                #need to implement this such that it searches only in area of interest
-                sout[i] = None
+        if trace:
+            #need to implement this such that it searches only in area of interest
+            sout[scipy.logical_or(sout > self.norm.s[-1], sout < self.norm.s[-2])] = None
 
         return sout
 
@@ -428,8 +448,23 @@ class Beam(geometry.Origin):
         return out
 
 class subBeam(Beam):
-    r"""Generate an array of Beam objects from two surface objects
-    
+    r"""Generate an array of sub-chords between two surface objects
+
+    Both surfaces are split into equal segments and a chord is
+    generated from the center of every segment of surf1 to the
+    center of every segment of surf2. The etendue of each chord is
+    that of its pair of segments,
+
+    .. math::
+        A_1 A_2 \cos\theta_1 \cos\theta_2 / d^2
+
+    where segments whose center lies outside of the surface (for
+    Ellipse and Circle) have no etendue. All sub-chords are stored
+    in arrays, with unit, s, norm.unit, sagi and meri of shape
+    (3,)+shape or shape and norm.s of shape (k,)+shape, such that the
+    sub-chords are traced in a single call by Tokamak.trace. They
+    can be used directly by volWeightBeam.
+
     Args:
         surf1: Surface object
             Beam origin surfaces, based on the coordinate system
@@ -447,114 +482,448 @@ class subBeam(Beam):
             Describes how many segments to split surf1 in [sagi,meri]
 
         split2: two-element tuple
-            Describes how many segments to split surf1 in [sagi,meri]
+            Describes how many segments to split surf2 in [sagi,meri]
 
     Returns:
-        output: multiBeam object.
+        output: subBeam object, of shape (split1[1], split1[0],
+            split2[1], split2[0]). The beam between the centers of the
+            surfaces is accessible through .main.
         
     Examples:
-        Accepts all surface or surface-derived object inputs, though all data 
-        is stored as a python object.
-
-        Generate an y direction Ray in cartesian coords using a Vec from (0,0,1)::
+        Split a diode into 2x2 and the aperture into 4x4, trace and
+        weight all 64 sub-chords::
             
-                cen = geometry.Center(flag=True)
-                ydir = geometry.Vecx((0,1,0))
-                zpt = geometry.Point((0,0,1),cen)
+                beams = subBeam(diode, aperture, [2,2], [4,4])
+                plasma.trace(beams)
+                weight = volWeightBeam(beams,
+                                       plasma.eq.getRGrid(),
+                                       plasma.eq.getZGrid())
 
     """
 
     def __init__(self, surf1, surf2, split1 = None, split2 = None):
         """
         """
-        
+        if not surf1._origin is surf2._origin:
+            raise ValueError("points must exist in same coordinate system")
+
         #generating grid off of split1, split2 kwargs
         if split1 is None:
             split1 = [1,1]
         if split2 is None:
             split2 = [1,1]
 
-        ins1 = old_div(float((split1[0]-1)),split1[0])
-        inm1 = old_div(float((split1[1]-1)),split1[1])
-        ins2 = old_div(float((split2[0]-1)),split2[0])
-        inm2 = old_div(float((split2[1]-1)),split2[1]) 
-
-        grid = scipy.meshgrid(surf1.sagi.s*scipy.linspace(-ins1,
-                                                           ins1,
-                                                           split1[0]),
-                              surf1.meri.s*scipy.linspace(-inm1,
-                                                           inm1,
-                                                           split1[1]),
-                              surf2.sagi.s*scipy.linspace(-ins2,
-                                                           ins2,
-                                                           split2[0]),
-                              surf2.meri.s*scipy.linspace(-inm2,
-                                                           inm2,
-                                                           split2[1]))
-        
-        #check to see if they are in same coordinate system
-        print((surf1.x0() + surf1.sagi(grid[0]).x0()).shape)
-        surf1 + surf1.sagi(grid[0])
-        surf1cents = surf1 + surf1.sagi(grid[0]) + surf1.meri(grid[1]) #vectors
-        surf2cents = surf2 + surf2.sagi(grid[2]) + surf2.meri(grid[3])
-
+        grid = scipy.meshgrid(surf1.meri.s*_segments(split1[1]),
+                              surf1.sagi.s*_segments(split1[0]),
+                              surf2.meri.s*_segments(split2[1]),
+                              surf2.sagi.s*_segments(split2[0]),
+                              indexing='ij')
+
+        # cartesian centers of the segments, of shape shape+(3,)
+        surf1cents = (surf1.x() +
+                      grid[1][...,scipy.newaxis]*surf1.sagi.unit +
+                      grid[0][...,scipy.newaxis]*surf1.meri.unit)
+        surf2cents = (surf2.x() +
+                      grid[3][...,scipy.newaxis]*surf2.sagi.unit +
+                      grid[2][...,scipy.newaxis]*surf2.meri.unit)
+
+        norm = surf2cents - surf1cents
+        length = scipy.sqrt(scipy.sum(norm**2, axis=-1))
+        norm /= length[...,scipy.newaxis]
+
+        #calculate area of the segments at diode and aperature
+        a1 = old_div(4*surf1.sagi.s*surf1.meri.s, split1[0]*split1[1])*surf1.edgetest(grid[1], grid[0])
+        a2 = old_div(4*surf2.sagi.s*surf2.meri.s, split2[0]*split2[1])*surf2.edgetest(grid[3], grid[2])
         del grid
-        self.norm = surf2cents - surf1cents
-        self.s = surf1cents.s
-        self.unit = surf1cents.unit
+
+        #generate etendue
+        self.etendue = a1*a2*abs(scipy.dot(norm, surf1.norm.unit)*
+                                 scipy.dot(norm, surf2.norm.unit))/length**2
+
         #orthogonal coordinates based off of connecting normal
+        sagi = _perpendicular(old_div(surf1.sagi.s, split1[0])*surf1.sagi.unit, norm)
+        meri = _perpendicular(old_div(surf1.meri.s, split1[1])*surf1.meri.unit, norm)
 
-        self.sagi = surf1.sagi - self.norm*((surf1.sagi * self.norm)*(old_div(surf1.sagi.s,self.norm.s)))
-        self.meri = surf1.meri - self.norm*((surf1.meri * self.norm)*(old_div(surf1.meri.s,self.norm.s)))
-        
         #reduce calcuations in calling super to inherited classes
         self._origin = surf1._origin
         self._depth = surf1._depth
         self.flag = surf1.flag
+        self.shape = length.shape
 
-        #calculate area at diode.
-        self.sagi.s /= split1[0]
-        self.meri.s /= split1[1]
-        a1 = surf1.area(self.sagi.s,self.meri.s)
+        # stored following the Vec convention of cartesian axis first
+        s = scipy.sqrt(scipy.sum(surf1cents**2, axis=-1))
+        self.s = s
+        self.unit = scipy.rollaxis(old_div(surf1cents, scipy.where(s == 0, 1., s)[...,scipy.newaxis]), -1)
+        self.norm = _arrayVec(scipy.rollaxis(norm, -1), scipy.array([scipy.zeros(self.shape), length]))
+        self.sagi = _arrayVec(*sagi)
+        self.meri = _arrayVec(*meri)
 
-        #calculate area at aperature
-        a2 = old_div(surf2.area(((old_div((self.sagi*surf2.sagi),self.sagi.s))**2
-                         + (old_div((self.meri*surf2.sagi),self.meri.s))**2)**.5,
-                        ((old_div((self.sagi*surf2.meri),self.sagi.s))**2 
-                         + (old_div((self.meri*surf2.meri),self.meri.s))**2)**.5),(split2[0]*split2[1]))
-
-        #generate etendue
-        self.etendue = a1*a2/(self.norm.s ** 2)
-        self.shape = self.s.shape[:]
         self.main = Beam(surf1,surf2) #minimal memory waste, but infinitely useful for minimizing calculations
-        #self.flatten()
-        # flatten data, but store original shapes.
 
     def flatten(self):
-
-        self.etendue = self.etendue.ravel()
-        self.s = self.s.ravel()
-        self.unit = self.unit.reshape((3,old_div(self.unit.size,3)))
-        self.norm.s = self.norm.s.ravel()
-        self.norm.unit = self.unit.reshape((3,old_div(self.norm.unit.size,3)))
+        """ views all arrays with the sub-chords along a single axis"""
+        self._reshape((int(scipy.prod(self.shape)),))
 
     def reshape(self):
-        raise NotImplementedError(' not yet')
+        """ views all arrays with the sub-chords along the axes of the
+        original shape, undoing flatten"""
+        self._reshape(self.shape)
+
+    def x(self):
+        """returns array of cartesian coordinate in meters of the s
+        values of each sub-chord, of shape (3,k)+shape
+
+        Returns:
+           numpy array of cartesian coordinates in meters
+
+        """
+        return self(self.norm.s).x()
+
+    def r(self):
+        """return cylindrical coordinate values of the s values of each
+        sub-chord, of shape (3,k)+shape
+
+        Returns:
+            numpy array of cylindrical coordinates in meters and radians
+
+        """
+        return self(self.norm.s).r()
+
+    def redefine(self, neworigin):
+        """redefine subBeam into new coordinate system
+
+        Args:
+            neworigin: Origin or Origin-derived object
+        """
+        trans = scipy.dot(neworigin._fromCenter(), self._origin._toCenter())
+        pt0 = (scipy.tensordot(trans[:3,:3], self.unit*self.s, axes=1) +
+               trans[:3,3].reshape((3,) + (1,)*self.s.ndim))
+        self.s = scipy.sqrt(scipy.sum(pt0**2, axis=0))
+        self.unit = old_div(pt0, scipy.where(self.s == 0, 1., self.s))
+        for i in (self.norm, self.sagi, self.meri):
+            i.unit = scipy.tensordot(trans[:3,:3], i.unit, axes=1)
+
+        self.main.redefine(neworigin)
+        self._origin = neworigin
+        self._depth = neworigin._depth + 1
+
+    def __len__(self):
+        return self.s.size
 
     def __getitem__(self,idx):
-        return geometry.Vec(self.unit[idx],s=self.s[idx]) + self.norm[idx]
+        """ returns a Beam object (a copy) of a sub-chord, where idx
+        is a tuple of indices of the current shape"""
+        if not isinstance(idx, tuple):
+            idx = (idx,)
+        vec = (slice(None),) + idx
+
+        output = Beam.__new__(Beam)
+        geometry.Point.__init__(output, geometry.Vecx(self.unit[vec]*self.s[idx]), ref=self._origin)
+        output.flag = self.flag
+
+        output.norm = geometry.Vec(self.norm.unit[vec].copy(), self.norm.s[vec].copy())
+        output.sagi = geometry.Vec(self.sagi.unit[vec].copy(), self.sagi.s[idx])
+        output.meri = geometry.Vec(self.meri.unit[vec].copy(), self.meri.s[idx])
+        output._rot = [output.sagi.unit,
+                       output.meri.unit,
+                       output.norm.unit]
+        output.etendue = scipy.atleast_1d(self.etendue[idx])
+        return output
+
+    def __iter__(self):
+        for idx in scipy.ndindex(self.s.shape):
+            yield self[idx]
 
     def __call__(self,inp):
-        """ call is used to minimize the changes to the norm vector.
-        it returns a vector"""
-        #temporarily store the norm.s
-        temp = self.norm.s
+        """ returns a Vec of the positions at s = inp along all
+        sub-chords. inp is either of shape (M,) for the same s values
+        along every sub-chord or (M,)+shape. The unit of the output is
+        of shape (3,M)+shape."""
+        inp = scipy.atleast_1d(inp)
+        if inp.ndim == 1:
+            inp = inp.reshape(inp.shape + (1,)*self.s.ndim)
+
+        return geometry.Vecx((self.unit*self.s)[:,scipy.newaxis] +
+                             self.norm.unit[:,scipy.newaxis]*inp)
+
+    def _arrays(self):
+        """ cartesian origins and unit directions (N,3), s values
+        (N,k) and etendues (N,) of the sub-chords, in flattened order.
+        All but the origins are views."""
+        return (scipy.reshape(self.unit*self.s, (3, -1)).T,
+                scipy.reshape(self.norm.unit, (3, -1)).T,
+                scipy.reshape(self.norm.s, (len(self.norm.s), -1)).T,
+                self.etendue.reshape((-1,)))
+
+    def _append(self, *args):
+        """ appends values (in flattened order) to the s values of
+        each sub-chord, see BeamArray._append"""
+        temp = _rightAlign(self._arrays()[2], *args)
+        self.norm.s = scipy.reshape(temp.T, (temp.shape[1],) + self.s.shape)
+
+    def _reshape(self, shape):
+        """ reshapes all arrays to shape, see flatten"""
+        for i in (self, self.sagi, self.meri):
+            i.unit = i.unit.reshape((3,) + shape)
+            i.s = i.s.reshape(shape)
+        self.norm.unit = self.norm.unit.reshape((3,) + shape)
+        self.norm.s = self.norm.s.reshape((len(self.norm.s),) + shape)
+        self.etendue = self.etendue.reshape(shape)
+
+
+def _segments(num):
+    """ centers of num equal segments of [-1,1]"""
+    return old_div(2*scipy.arange(num) - num + 1., num)
+
+
+def _perpendicular(vec, norm):
+    """ component of the cartesian vector vec perpendicular to the
+    unit vectors norm (shape+(3,)), as a tuple of the cartesian unit
+    vectors of shape (3,)+shape and their lengths"""
+    temp = vec - norm*scipy.dot(norm, vec)[...,scipy.newaxis]
+    length = scipy.sqrt(scipy.sum(temp**2, axis=-1))
+    return scipy.rollaxis(old_div(temp, length[...,scipy.newaxis]), -1), length
+
+
+def _arrayVec(unit, s):
+    """ Vec of arrays of cartesian unit vectors (3,)+shape, without
+    squeezing s"""
+    output = geometry.Vec.__new__(geometry.Vec)
+    output.unit = unit
+    output.s = s
+    output.flag = False
+    return output
 
-        self.norm.s = inp
-        out = self + self.norm
-        self.norm.s = temp
 
-        return out
+class BeamArray(object):
+    r"""Struct-of-arrays container for many beams or rays
+
+    Stores the cartesian origins, unit directions, s values and
+    etendues of N beams as arrays in a single coordinate system,
+    such that tracing and volume weighting operate on all beams
+    at once. Indexing with an integer (and iteration) returns an
+    individual Beam object (a copy) compatible with the single-beam
+    API, while slices and index arrays return a new BeamArray.
+
+    Args:
+        pt0: Array-like of shape (N,3)
+            Cartesian positions of the beam origins in meters.
+
+        norm: Array-like of shape (N,3)
+            Cartesian directions of the beams, normalized on input.
+
+        ref: Origin or Origin-derived object
+            Coordinate system in which pt0 and norm are defined.
+
+    Kwargs:
+        s: Array-like of shape (N,k)
+            s values in meters along each beam, following the
+            convention of Beam.norm.s. Rows are right-aligned such
+            that s[:,-2] and s[:,-1] bound the beam within the vessel
+            after tracing. Rows shorter than k are padded on the left
+            with their first value. Defaults to zeros of shape (N,1).
+
+        etendue: Array-like of shape (N,)
+            Etendue of each beam, defaults to ones.
+
+        sagi: Array-like of shape (N,3)
+            Cartesian sagittal vectors of each beam, whose lengths are
+            the half-widths at the beam origin. If not specified
+            along with meri, a zero-width orthogonal basis is generated.
+
+        meri: Array-like of shape (N,3)
+            Cartesian meridonial vectors of each beam.
+
+        flag: Boolean.
+            Sets the default coordinate nature of the generated Beam
+            objects, inherited from ref if not specified.
+
+    Examples:
+        Generate a BeamArray from traced XTOMO chords::
+
+                beams = beams2Array(XTOMO.XTOMO1beam(plasma))
+
+        Trace 1000 rays from a point in all directions in the midplane::
+
+                theta = scipy.linspace(-scipy.pi, scipy.pi, 1000)
+                norm = scipy.array([scipy.cos(theta),
+                                    scipy.sin(theta),
+                                    scipy.zeros(theta.shape)]).T
+                rays = BeamArray(scipy.tile([.7, 0., 0.], (1000, 1)),
+                                 norm,
+                                 plasma)
+                plasma.trace(rays)
+
+    """
+
+    def __init__(self, pt0, norm, ref, s=None, etendue=None, sagi=None, meri=None, flag=None):
+        """
+        """
+        self.pt0 = scipy.array(pt0, dtype=float).reshape((-1,3))
+        self.norm = scipy.array(norm, dtype=float).reshape((-1,3))
+        self.norm /= scipy.sqrt(scipy.sum(self.norm**2, axis=1))[:,scipy.newaxis]
+
+        if s is None:
+            s = scipy.zeros((len(self.pt0), 1))
+        self.s = scipy.array(s, dtype=float).reshape((len(self.pt0), -1))
+
+        if etendue is None:
+            etendue = scipy.ones((len(self.pt0),))
+        self.etendue = scipy.array(etendue, dtype=float).reshape((len(self.pt0),))
+
+        if sagi is None or meri is None:
+            # generate an orthogonal basis of zero width
+            meri = scipy.cross(self.norm, [0., 0., 1.])
+            temp = scipy.sum(meri**2, axis=1) == 0
+            meri[temp] = scipy.cross(self.norm[temp], [1., 0., 0.])
+            sagi = 0.*scipy.cross(meri, self.norm)
+            meri *= 0.
+
+        self.sagi = scipy.array(sagi, dtype=float).reshape((-1,3))
+        self.meri = scipy.array(meri, dtype=float).reshape((-1,3))
+
+        self._origin = ref
+        self._depth = ref._depth + 1
+        if flag is None:
+            flag = ref.flag
+        self.flag = flag
+
+    def __len__(self):
+        return len(self.pt0)
+
+    def __getitem__(self, idx):
+        if scipy.isscalar(idx):
+            return self._beam(idx)
+        
+        return BeamArray(self.pt0[idx],
+                         self.norm[idx],
+                         self._origin,
+                         s=self.s[idx],
+                         etendue=self.etendue[idx],
+                         sagi=self.sagi[idx],
+                         meri=self.meri[idx],
+                         flag=self.flag)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._beam(i)
+
+    def __call__(self, inp):
+        """ returns a Vec of the positions at s = inp along all beams.
+        inp is either of shape (M,) for the same s values along every
+        beam or (N,M). The unit of the output is of shape (3,N,M)."""
+        inp = scipy.atleast_1d(inp)
+        return geometry.Vecx((self.pt0[:,0,scipy.newaxis] + self.norm[:,0,scipy.newaxis]*inp,
+                              self.pt0[:,1,scipy.newaxis] + self.norm[:,1,scipy.newaxis]*inp,
+                              self.pt0[:,2,scipy.newaxis] + self.norm[:,2,scipy.newaxis]*inp))
+
+    def _beam(self, idx):
+        """ generates Beam object of beam idx"""
+        output = Beam.__new__(Beam)
+        geometry.Point.__init__(output, geometry.Vecx(self.pt0[idx]), ref=self._origin)
+        output.flag = self.flag
+
+        output.norm = geometry.Vec(self.norm[idx].copy(), self.s[idx].copy())
+        output.sagi = geometry.Vecx(self.sagi[idx])
+        output.meri = geometry.Vecx(self.meri[idx])
+        output._rot = [output.sagi.unit,
+                       output.meri.unit,
+                       output.norm.unit]
+        output.etendue = scipy.atleast_1d(self.etendue[idx])
+        return output
+
+    def redefine(self, neworigin):
+        """redefine BeamArray into new coordinate system
+
+        Args:
+            neworigin: Origin or Origin-derived object
+        """
+        trans = scipy.dot(neworigin._fromCenter(), self._origin._toCenter())
+        self.pt0 = scipy.dot(self.pt0, trans[:3,:3].T) + trans[:3,3]
+        self.norm = scipy.dot(self.norm, trans[:3,:3].T)
+        self.sagi = scipy.dot(self.sagi, trans[:3,:3].T)
+        self.meri = scipy.dot(self.meri, trans[:3,:3].T)
+        self._origin = neworigin
+        self._depth = neworigin._depth + 1
+
+    def _append(self, *args):
+        """ appends values to s of each beam, where nan values are not
+        appended. Rows are kept right-aligned and padded with the first
+        value of the row."""
+        self.s = _rightAlign(self.s, *args)
+
+
+def _rightAlign(s, *args):
+    """ appends the values of args to the rows of s (N,k), where nan
+    values are not appended. Rows are kept right-aligned and padded
+    with the first value of the row."""
+    temp = scipy.concatenate([s] + [scipy.atleast_1d(i)[:,scipy.newaxis] for i in args], axis=1)
+    order = scipy.argsort(~scipy.isnan(temp), axis=1, kind='mergesort')
+    temp = temp[scipy.arange(len(temp))[:,scipy.newaxis], order]
+    temp = temp[:,scipy.isnan(temp).sum(axis=1).min():]
+    return scipy.where(scipy.isnan(temp), s[:,:1], temp)
+
+
+def setThreads(num=None):
+    r"""Sets the number of OpenMP threads of the _beam kernels
+
+    The intercept and weighting kernels of _beam are parallelized
+    over rays and time slices when the library is compiled with
+    OpenMP (see the makefile), otherwise a single thread is used.
+
+    Kwargs:
+        num: int
+            Number of threads, if not specified only the current 
+            value is returned. This overrides the OMP_NUM_THREADS
+            environment variable.
+
+    Returns:
+        Number of threads used by the kernels.
+
+    """
+    if not num is None:
+        _beam.set_num_threads(num)
+    return int(_beam.get_num_threads()[0])
+
+
+def beams2Array(beam):
+    r"""Generate a BeamArray from Beam objects
+
+    Args:
+        beam: Beam object or nested tuple of Beam objects
+            All beams must be defined in the same coordinate system.
+
+    Returns:
+        BeamArray object, in the order of the flattened input.
+
+    Examples:
+        Convert the output of multiBeam::
+
+                beams = beams2Array(multiBeam(surf1, surf2))
+
+    """
+    beams = _flatten(beam)
+    ref = beams[0]._origin
+    for i in beams:
+        if not i._origin is ref:
+            raise ValueError('beams must exist in same coordinate system, use redefine')
+
+    # s values are right-aligned, padded with their first value
+    s = scipy.zeros((len(beams), max([i.norm.s.size for i in beams])))
+    for i in range(len(beams)):
+        temp = scipy.atleast_1d(beams[i].norm.s)
+        s[i] = temp[0]
+        s[i,s.shape[1] - temp.size:] = temp
+
+    return BeamArray(scipy.array([i.unit*i.s for i in beams]),
+                     scipy.array([i.norm.unit for i in beams]),
+                     ref,
+                     s=s,
+                     etendue=scipy.array([scipy.atleast_1d(i.etendue)[0] for i in beams]),
+                     sagi=scipy.array([i.sagi.x() for i in beams]),
+                     meri=scipy.array([i.meri.x() for i in beams]),
+                     flag=beams[0].flag)
+
 
 def multiBeam(surf1, surf2, split=None):
     r"""Generate a tuple of Beam objects from tuples of surface objects
@@ -593,142 +962,577 @@ def multiBeam(surf1, surf2, split=None):
     try:
         output += [Beam(surf1,surf2)]
                 
-    except AttributeError:
+    except (AttributeError, TypeError):
+        # SurfaceArray objects, like nested iterables of surfaces, are
+        # not surfaces themselves
         try:
             for i in surf1:
                 try:
                     output += [Beam(i,surf2)]
-                except AttributeError:
+                except (AttributeError, TypeError):
                     output += multiBeam(i,surf2)
                     
         except TypeError:
             for i in surf2:
                 try:
                     output += [Beam(surf1,i)]
-                except AttributeError:
+                except (AttributeError, TypeError):
                     output += multiBeam(surf1,i)
                 
     return output
 
 
-def volWeightBeam(beam, rgrid, zgrid, trace=True, ds=2e-3, toroidal=None, **kwargs):
-    r"""Generate a tuple of Beam objects from tuples of surface objects
-    
+def cachedBeam(surf1, surf2, tokamak, cache, split=None, limiter=0):
+    r"""Traced beams between surfaces through a persistent on-disk cache
+
+    Equivalent to tracing multiBeam(surf1, surf2, split) through the
+    tokamak and converting it with beams2Array, but the result is
+    stored in the directory cache under a content hash of the
+    geometry: the type, position, basis and extent of every surface,
+    the vessel outline and 3D wall of the tokamak, split and limiter.
+    Any later call with identical geometry loads the stored origins,
+    directions, s values and etendues, skipping the construction and
+    tracing of the beams entirely. Entries are uncompressed .npy
+    files, which are memory-mapped copy-on-write on loading such that
+    the cache itself is never modified. Entries are written atomically,
+    such that many processes can share a cache directory.
+
+    The key covers the geometry and Tokamak._traceVersion, but not the
+    code itself: entries traced before a change of the tracing which
+    did not increment _traceVersion are served unchanged. Empty the
+    cache directory when in doubt.
+
     Args:
-        beam: tuple of Surfaces or a Surface object
-            Beam origin surfaces, based on the coordinate system
-            of the surfaces.  Center position is accessible through Beam(0),
-            Beam.x()[...,0] or Beam.r()[...,0] (last two options create
-            numpy arrays, the first generats a geometry.Vec object).
+        surf1: tuple of Surfaces or a Surface object
+            Beam origin surfaces, see multiBeam.
 
-        rgrid: tuple of Surfaces or a Surface object
-            Direction of the ray can be defined by a vector object (assumed
-            to be in the space of the pt1 origin) from pt1, or a point, which 
-            generates a vector pointing from pt1 to pt2.
-            
-        zgrid: tuple of Surfaces or a Surface object
-            Direction of the ray can be defined by a vector object (assumed
-            to be in the space of the pt1 origin) from pt1, or a point, which 
-            generates a vector pointing from pt1 to pt2.
+        surf2: tuple of Surfaces or a Surface object
+            Beam end surfaces, see multiBeam.
+
+        tokamak: Tokamak object
+            Vessel through which the beams are traced.
+
+        cache: string
+            Path of the cache directory, which is created if needed.
+
+    Kwargs:
+        split: two-element tuple
+            Splitting of the surfaces, see multiBeam.
+
+        limiter: int or array-like of ints.
+            Number of additional intersections to skip, see
+            Tokamak.trace.
 
     Returns:
-        output: tuple of beam objects.
-        
+        BeamArray of the traced beams in the coordinates of tokamak.
+
     Examples:
-        Accepts all surface or surface-derived object inputs, though all data 
-        is stored as a python object.
+        Load the XTOMO1 chords from a cache in the home directory::
 
-        Generate an y direction Ray in cartesian coords using a Vec from (0,0,1)::
-            
-                cen = geometry.Center(flag=True)
-                ydir = geometry.Vecx((0,1,0))
-                zpt = geometry.Point((0,0,1),cen)
+                temp = XTOMO.XTOMO1(plasma)
+                beams = cachedBeam(temp[:-1], temp[-1], plasma, '~/.trippy')
 
     """
-    out = scipy.zeros((len(rgrid)-1,len(zgrid)-1))
+    cache = os.path.expanduser(cache)
+    path = os.path.join(cache, _geometryHash(surf1, surf2, tokamak, split, limiter))
+
     try:
-        if toroidal is None:
-            if trace:
-                temp = beam(scipy.mgrid[beam.norm.s[-2]:beam.norm.s[-1]:ds]).r()
-            else:
-                temp = beam(scipy.mgrid[beam.norm.s[0]:beam.norm.s[-1]:ds]).r()
-                
-            out += scipy.histogram2d(temp[0],
-                                     temp[2], 
-                                     bins = [rgrid, zgrid],
-                                     weights=scipy.ones(temp[0].shape)*beam.etendue*ds)[0]
-        else:
-            if trace:
-                temp = beam(scipy.mgrid[beam.norm.s[-2]:beam.norm.s[-1]:ds]).t(toroidal[0],toroidal[1])
-            else:
-                temp = beam(scipy.mgrid[beam.norm.s[0]:beam.norm.s[-1]:ds]).t(toroidal[0],toroidal[1])
-            
-            out += scipy.histogram2d(temp[2],
-                                     temp[0],
-                                     bins = [rgrid, zgrid],
-                                     weights=scipy.ones(temp[0].shape)*beam.etendue*ds)[0]
+        return _loadArray(path, tokamak)
+    except IOError:
+        pass
+
+    beams = multiBeam(surf1, surf2, split=split)
+    tokamak.trace(beams, limiter=limiter)
+    output = beams2Array(beams)
+
+    # write to a temporary directory first, such that an entry is
+    # either complete or absent
+    if not os.path.isdir(cache):
+        os.makedirs(cache)
+    temp = tempfile.mkdtemp(dir=cache)
+    for i in _cacheFields:
+        scipy.save(os.path.join(temp, i + '.npy'), getattr(output, i))
+    scipy.save(os.path.join(temp, 'flag.npy'), output.flag)
+    try:
+        os.rename(temp, path)
+    except OSError:
+        # another process stored the same entry
+        for i in os.listdir(temp):
+            os.remove(os.path.join(temp, i))
+        os.rmdir(temp)
+
+    return output
+
+
+_cacheFields = ('pt0', 'norm', 's', 'etendue', 'sagi', 'meri')
+
+
+def _loadArray(path, ref):
+    """ BeamArray of memory-mapped arrays of a cache entry"""
+    output = BeamArray.__new__(BeamArray)
+    for i in _cacheFields:
+        setattr(output, i, scipy.load(os.path.join(path, i + '.npy'), mmap_mode='c'))
+
+    output._origin = ref
+    output._depth = ref._depth + 1
+    output.flag = bool(scipy.load(os.path.join(path, 'flag.npy')))
+    return output
+
+
+def _geometryHash(surf1, surf2, tokamak, split, limiter):
+    """ hexadecimal content hash of the beam geometry for cachedBeam"""
+    hasher = hashlib.sha1(b'TRIPPy.cachedBeam.1')
+    for i in (surf1, surf2):
+        hasher.update(b'surf')
+        _hashSurf(hasher, i)
+
+    hasher.update(b'tokamak')
+    hasher.update(repr(tokamak._traceVersion).encode())
+    _hashArrays(hasher, tokamak._toCenter(), tokamak.meri.s, tokamak.norm.s)
+    if not tokamak.wall is None:
+        _hashArrays(hasher, tokamak.wall.vert, tokamak.wall.face)
+
+    hasher.update(repr((split, scipy.array(limiter).tolist())).encode())
+    return hasher.hexdigest()
+
+
+def _hashSurf(hasher, surf):
+    """ adds the type, position, basis and extent of surfaces in a
+    nested iterable or SurfaceArray to hasher"""
+    try:
+        temp = (surf.x(),
+                surf.sagi.unit,
+                surf.meri.unit,
+                surf.norm.unit,
+                surf.sagi.s,
+                surf.meri.s,
+                surf.norm.s)
+        name = type(surf).__name__
+
     except AttributeError:
-        for i in beam:
-            try:
-                out += volWeightBeam(i, rgrid, zgrid, trace=trace, ds=ds, toroidal=toroidal, **kwargs)
-            except TypeError:
-                pass
+        try:
+            # SurfaceArray
+            temp = (surf.pt0, surf.sagi, surf.meri, surf.norm, surf.length)
+            name = surf.obj.__name__
+        except AttributeError:
+            for i in surf:
+                _hashSurf(hasher, i)
+            return
 
-    return out
+    hasher.update(name.encode())
+    _hashArrays(hasher, surf._origin._toCenter(), *temp)
 
 
+def _hashArrays(hasher, *args):
+    """ adds the shape and values of arrays to hasher, rounded such
+    that the hash is insensitive to floating point noise"""
+    for i in args:
+        temp = scipy.around(scipy.array(i, dtype=float), 12) + 0.
+        hasher.update(repr(temp.shape).encode())
+        hasher.update(scipy.ascontiguousarray(temp).tobytes())
+
+
+def sampleBeam(surf1, surf2, num=1024, method='halton', replicas=8, seed=None):
+    r"""Samples rays between two surfaces by randomized quasi-Monte Carlo
+
+    Pairs of points are drawn on surf1 and surf2 from a four
+    dimensional low-discrepancy sequence (Halton or Sobol), and a
+    ray is generated from each point on surf1 towards its point on
+    surf2. The etendue of each ray is its share of the etendue of
+    the surface pair,
+
+    .. math::
+        A_1 A_2 \cos\theta_1 \cos\theta_2 / (N d^2)
+
+    such that the sum over the rays converges to the etendue of the
+    full beam, rather than the paraxial estimate of Beam. The sequence
+    is randomized replicas times independently (a random shift for
+    Halton, scrambling for Sobol), which provides the convergence
+    estimate from the scatter between replicas.
 
-def volWeightBeam3d(beam, xgrid, ygrid, zgrid, trace=0, ds=2e-3, **kwargs):
-    r"""Generate a tuple of Beam objects from tuples of surface objects
-    
     Args:
-        beam: tuple of Surfaces or a Surface object
-            Beam origin surfaces, based on the coordinate system
-            of the surfaces.  Center position is accessible through Beam(0),
-            Beam.x()[...,0] or Beam.r()[...,0] (last two options create
-            numpy arrays, the first generats a geometry.Vec object).
+        surf1: Surface object (Rect, Ellipse, Circle or Cyl)
+            Ray origin surface, commonly the detector.
 
-        rgrid: tuple of Surfaces or a Surface object
-            Direction of the ray can be defined by a vector object (assumed
-            to be in the space of the pt1 origin) from pt1, or a point, which 
-            generates a vector pointing from pt1 to pt2.
+        surf2: Surface object (Rect, Ellipse, Circle or Cyl)
+            Surface towards which rays are generated, commonly the
+            aperture. Must share the coordinate system of surf1.
+
+    Kwargs:
+        num: integer
+            Number of rays, rounded up to a multiple of replicas.
+            Powers of two are best suited for Sobol sequences.
+
+        method: string
+            'halton' (default) or 'sobol', the latter requiring
+            scipy.stats.qmc.
+
+        replicas: integer
+            Number of independent randomizations of the sequence,
+            of num/replicas rays each. Rays of each replica form
+            contiguous blocks of the output.
+
+        seed: integer or None
+            Seed of the randomization.
+
+    Returns:
+        (BeamArray, error) tuple. The BeamArray is of s=[0, d] between
+        the two surfaces, ready for tracing and volWeightBeam. error is
+        the relative standard error of the total etendue between the
+        replicas. The same blocks can be used to estimate the error of
+        any quantity linear in the rays, such as a volume weighting.
+
+    Examples:
+        Sample 4096 rays of a detector and aperture and weight them::
+
+                rays, err = sampleBeam(diode, aperture, num=4096)
+                plasma.trace(rays)
+                weight = volWeightBeam(rays, rgrid, zgrid)
+
+    """
+    if not surf1._origin is surf2._origin:
+        raise ValueError("surfaces must exist in same coordinate system")
+
+    if replicas < 1:
+        raise ValueError("replicas must be a positive integer")
+
+    block = -(-int(num)//int(replicas))
+    random = scipy.random.RandomState(seed)
+
+    if method == 'halton':
+        temp = _halton(block, 4)
+        u = scipy.concatenate([(temp + random.random_sample(4)) % 1. for i in range(replicas)])
+
+    elif method == 'sobol':
+        try:
+            from scipy.stats import qmc
+        except ImportError:
+            raise ImportError("method 'sobol' requires scipy.stats.qmc")
+
+        u = scipy.concatenate([qmc.Sobol(4, scramble=True, seed=random.randint(2**31)).random(block)
+                               for i in range(replicas)])
+
+    else:
+        raise ValueError("method must be 'halton' or 'sobol'")
+
+    pt0, norm1, area1 = surf1.sample(u[:,0], u[:,1])
+    pt1, norm2, area2 = surf2.sample(u[:,2], u[:,3])
+
+    norm = pt1 - pt0
+    length = scipy.sqrt(scipy.sum(norm**2, axis=1))
+    norm /= length[:,scipy.newaxis]
+
+    etendue = (area1*area2*abs(scipy.sum(norm*norm1, axis=1)*scipy.sum(norm*norm2, axis=1))
+               /(len(u)*length**2))
+
+    # replica estimates of the total etendue
+    totals = replicas*etendue.reshape((replicas, block)).sum(axis=1)
+    if replicas > 1:
+        error = old_div(totals.std(ddof=1), scipy.sqrt(replicas)*abs(totals.mean()))
+    else:
+        error = scipy.nan
+
+    return BeamArray(pt0,
+                     norm,
+                     surf1._origin,
+                     s=scipy.array([scipy.zeros(length.shape), length]).T,
+                     etendue=etendue,
+                     flag=surf1.flag), error
+
+
+def _halton(num, dim):
+    """ first num points of the dim dimensional Halton sequence,
+    skipping the origin, as an array of shape (num, dim)"""
+    primes = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    if dim > len(primes):
+        raise ValueError("dim must be no larger than "+str(len(primes)))
+
+    output = scipy.zeros((num, dim))
+    for j in range(dim):
+        idx = scipy.arange(1, num + 1)
+        frac = 1.
+        while idx.any():
+            frac /= primes[j]
+            output[:,j] += frac*(idx % primes[j])
+            idx //= primes[j]
+
+    return output
+
+
+def volWeightBeam(beam, rgrid, zgrid, trace=True, ds=2e-3, toroidal=None, exact=True, sparse=False, **kwargs):
+    r"""Generates the volume weighting of beams on a poloidal (R,Z) grid
+    
+    Args:
+        beam: Beam object, BeamArray or tuple of Beam objects
+            Beams which have been traced through a Tokamak object.
+            The weighting of each beam is its etendue multiplied by
+            the length of the beam within each cell of the grid.
+
+        rgrid: scipy-array of floats
+            Monotonically increasing cell edges in the radial direction
+            in meters.
             
-        zgrid: tuple of Surfaces or a Surface object
-            Direction of the ray can be defined by a vector object (assumed
-            to be in the space of the pt1 origin) from pt1, or a point, which 
-            generates a vector pointing from pt1 to pt2.
+        zgrid: scipy-array of floats
+            Monotonically increasing cell edges in the vertical direction
+            in meters.
+
+    Kwargs:
+        trace: bool
+            If True, only the beam within the vacuum vessel (between
+            norm.s[-2] and norm.s[-1]) is weighted, otherwise the full
+            beam from norm.s[0] is used.
+
+        ds: float
+            Step size along the beam in meters for the sampled
+            weighting (toroidal or exact=False).
+
+        toroidal: two-element tuple of floats
+            (r,z) center of a toroidal coordinate system, in which
+            case rgrid and zgrid are cell edges in poloidal angle and
+            minor radius respectively. This always uses the sampled
+            weighting.
+
+        exact: bool
+            If True (default), the analytic path length of the beam
+            through each (R,Z) cell is used, otherwise the beam is
+            sampled every ds and binned.
+
+        sparse: bool
+            If True, a scipy.sparse CSR matrix of shape
+            (number of beams, (len(rgrid)-1)*(len(zgrid)-1)) is returned
+            with one row per beam (following the flattened order of
+            beam), with cells ordered as output.ravel().
 
     Returns:
-        output: tuple of beam objects.
+        output: scipy-array of shape (len(rgrid)-1, len(zgrid)-1)
+            Sum of the weighting of all beams in meters cubed.
         
     Examples:
-        Accepts all surface or surface-derived object inputs, though all data 
-        is stored as a python object.
-
-        Generate an y direction Ray in cartesian coords using a Vec from (0,0,1)::
+        Generate the weighting of traced XTOMO chords on the
+        equilibrium grid::
             
-                cen = geometry.Center(flag=True)
-                ydir = geometry.Vecx((0,1,0))
-                zpt = geometry.Point((0,0,1),cen)
+                beams = XTOMO.XTOMO1beam(plasma)
+                weight = volWeightBeam(beams,
+                                       plasma.eq.getRGrid(),
+                                       plasma.eq.getZGrid())
 
     """
-    out = scipy.zeros((len(xgrid)-1,len(ygrid)-1,len(zgrid)-1))
+    output = _sparseWeight(beam,
+                           (len(rgrid)-1)*(len(zgrid)-1),
+                           _volWeightCells,
+                           rgrid,
+                           zgrid,
+                           trace=trace,
+                           ds=ds,
+                           toroidal=toroidal,
+                           exact=exact)
+    if sparse:
+        return output
+
+    return scipy.asarray(output.sum(axis=0)).reshape((len(rgrid)-1,len(zgrid)-1))
+
+
+def _volWeightCells(pt0, norm, s, etendue, rgrid, zgrid, trace=True, ds=2e-3, toroidal=None, exact=True):
+    """ flattened cell indices and weights of a single beam, see volWeightBeam"""
+    if trace:
+        lim = s[-2:]
+    else:
+        lim = s[[0,-1]]
+
+    if toroidal is None and exact:
+        idx1, idx2, length = _cellPathLength(pt0, norm, lim, rgrid, zgrid)
+        return idx1*(len(zgrid)-1) + idx2, length*etendue
+
+    temp = pt0[:,scipy.newaxis] + norm[:,scipy.newaxis]*scipy.mgrid[lim[0]:lim[1]:ds]
+    r = scipy.sqrt(temp[0]**2 + temp[1]**2)
+
+    if toroidal is None:
+        idx, good = _gridIndex((r, temp[2]), (rgrid, zgrid))
+    else:
+        idx, good = _gridIndex((scipy.arctan2(temp[2] - toroidal[1], r - toroidal[0]),
+                                scipy.sqrt((r - toroidal[0])**2 + (temp[2] - toroidal[1])**2)),
+                               (rgrid, zgrid))
+
+    return idx, scipy.ones(idx.shape)*etendue*ds
+
+
+def _gridIndex(pts, grids):
+    """ flattened (C-order) index of the cells containing each point,
+    following the bin edge convention of scipy.histogramdd. Returns the
+    indices of points within the grid and the mask of those points."""
+    idx = 0
+    good = True
+    for i in range(len(grids)):
+        temp = scipy.searchsorted(grids[i], pts[i], side='right') - 1
+        temp[pts[i] == grids[i][-1]] = len(grids[i]) - 2
+        good = good & (temp >= 0) & (temp < len(grids[i]) - 1)
+        idx = idx*(len(grids[i]) - 1) + temp
+
+    return idx[good], good
+
+
+def _sparseWeight(beam, ncells, cellfun, *args, **kwargs):
+    """ assembles the CSR matrix (beam, cell) row by row from
+    cellfun(pt0, norm, s, etendue, *args, **kwargs), which returns
+    the cell indices and weights of a single beam."""
+    indptr = [0]
+    indices = [scipy.zeros((0,), dtype=int)]
+    data = [scipy.zeros((0,))]
+
+    for i in _beamArrays(beam):
+        idx, weight = cellfun(*(i + args), **kwargs)
+        indices += [idx]
+        data += [weight]
+        indptr += [indptr[-1] + len(idx)]
+
+    output = scipy.sparse.csr_matrix((scipy.concatenate(data),
+                                      scipy.concatenate(indices),
+                                      indptr),
+                                     shape=(len(indptr) - 1, ncells))
+    output.sum_duplicates()
+    return output
+
+
+def _beamArrays(beam):
+    """ yields the cartesian origin, unit direction, s values and
+    etendue of each beam of a Beam, BeamArray, subBeam or nested
+    iterable"""
+    if isinstance(beam, BeamArray):
+        for i in range(len(beam)):
+            yield beam.pt0[i], beam.norm[i], beam.s[i], beam.etendue[i]
+    elif isinstance(beam, subBeam):
+        for i in zip(*beam._arrays()):
+            yield i
+    else:
+        for i in _flatten(beam):
+            yield i.unit*i.s, i.norm.unit, i.norm.s, i.etendue
+
+
+def _flatten(beam, arrays=False):
+    """ returns list of all Beam or Ray objects in a nested iterable.
+    If arrays, BeamArray and subBeam objects are kept whole."""
+    if isinstance(beam, (BeamArray, subBeam)):
+        if arrays:
+            return [beam]
+        return list(beam)
     try:
-        temp = beam(scipy.mgrid[beam.norm.s[trace]:beam.norm.s[-1]:ds]).x()
-            
-        out += scipy.histogramdd(temp.T, 
-                                 bins = [xgrid, ygrid, zgrid],
-                                 weights=scipy.ones(temp[0].shape)*beam.etendue*ds)[0]
+        beam.norm
+        return [beam]
     except AttributeError:
+        output = []
         for i in beam:
-            try:
-                out += volWeightBeam(i, xgrid, ygrid, zgrid, trace=trace, ds=ds, **kwargs)
-            except TypeError:
-                pass
+            output += _flatten(i, arrays=arrays)
+        return output
+
+
+def _cellPathLength(pt0, norm, lim, rgrid, zgrid):
+    r"""Analytic path length of a beam through the cells of a (R,Z) grid
+
+    The beam is split at every intersection with the R = rgrid
+    cylinders, found with the quadratic formula for
+    :math:`R^2(s) = As^2 + Bs + C`, and the Z = zgrid planes, which
+    are linear in s. Each resulting segment lies within a single cell,
+    found from the position at the middle of the segment.
+
+    Args:
+        pt0: scipy-array of the cartesian origin of the beam
+
+        norm: scipy-array of the cartesian unit direction of the beam
+
+        lim: two-element scipy-array of the s bounds of the beam
+
+        rgrid: scipy-array of floats, cell edges in R in meters
+
+        zgrid: scipy-array of floats, cell edges in Z in meters
+
+    Returns:
+        (idx1, idx2, length) tuple of scipy-arrays, the R and Z cell
+        indices of each segment and its length in meters. A cell can
+        be crossed more than once by a single beam.
+    """
+    rgrid = scipy.asarray(rgrid, dtype=float)
+    zgrid = scipy.asarray(zgrid, dtype=float)
+
+    A = norm[0]**2 + norm[1]**2
+    B = 2*(pt0[0]*norm[0] + pt0[1]*norm[1])
+    C = pt0[0]**2 + pt0[1]**2
+
+    # crossings of the R = rgrid cylinders (no crossings for vertical beams)
+    s = [lim]
+    if A > 0:
+        temp = B**2 - 4*A*(C - rgrid**2)
+        temp = scipy.sqrt(temp[temp >= 0])
+        s += [.5*(-B - temp)/A, .5*(-B + temp)/A]
+
+    # crossings of the Z = zgrid planes
+    if norm[2] != 0:
+        s += [(zgrid - pt0[2])/norm[2]]
 
-    return out
+    s = scipy.concatenate(s)
+    s = scipy.sort(s[scipy.logical_and(s >= lim[0], s <= lim[1])])
 
+    length = scipy.diff(s)
+    mid = s[:-1] + length/2
+    idx1 = scipy.searchsorted(rgrid, scipy.sqrt(A*mid**2 + B*mid + C), side='right') - 1
+    idx2 = scipy.searchsorted(zgrid, pt0[2] + norm[2]*mid, side='right') - 1
 
+    good = (length > 0) & (idx1 >= 0) & (idx1 < len(rgrid) - 1) & (idx2 >= 0) & (idx2 < len(zgrid) - 1)
+    return idx1[good], idx2[good], length[good]
+
+
+
+def volWeightBeam3d(beam, xgrid, ygrid, zgrid, trace=0, ds=2e-3, sparse=False, **kwargs):
+    r"""Generates the volume weighting of beams on a cartesian (X,Y,Z) grid
+    
+    Args:
+        beam: Beam object, BeamArray or tuple of Beam objects
+            Beams which have been traced through a Tokamak object.
+
+        xgrid: scipy-array of floats
+            Monotonically increasing cell edges in x in meters.
+
+        ygrid: scipy-array of floats
+            Monotonically increasing cell edges in y in meters.
+            
+        zgrid: scipy-array of floats
+            Monotonically increasing cell edges in z in meters.
+
+    Kwargs:
+        trace: int
+            Index of norm.s from which the beam is sampled.
+
+        ds: float
+            Step size along the beam in meters.
+
+        sparse: bool
+            If True, a scipy.sparse CSR matrix of shape
+            (number of beams, number of cells) is returned with one row
+            per beam, with cells ordered as output.ravel().
+
+    Returns:
+        output: scipy-array of shape (len(xgrid)-1, len(ygrid)-1, len(zgrid)-1)
+            Sum of the weighting of all beams in meters cubed.
+
+    """
+    output = _sparseWeight(beam,
+                           (len(xgrid)-1)*(len(ygrid)-1)*(len(zgrid)-1),
+                           _volWeightCells3d,
+                           xgrid,
+                           ygrid,
+                           zgrid,
+                           trace=trace,
+                           ds=ds)
+    if sparse:
+        return output
+
+    return scipy.asarray(output.sum(axis=0)).reshape((len(xgrid)-1,len(ygrid)-1,len(zgrid)-1))
+
+
+def _volWeightCells3d(pt0, norm, s, etendue, xgrid, ygrid, zgrid, trace=0, ds=2e-3):
+    """ flattened cell indices and weights of a single beam, see volWeightBeam3d"""
+    temp = pt0[:,scipy.newaxis] + norm[:,scipy.newaxis]*scipy.mgrid[s[trace]:s[-1]:ds]
+    idx, good = _gridIndex(temp, (xgrid, ygrid, zgrid))
+    return idx, scipy.ones(idx.shape)*etendue*ds
 
 
 def _genBFEdgeZero(plasma, zeros, rcent, zcent):
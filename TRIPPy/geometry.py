@@ -738,57 +738,52 @@ class Point(Vec):
         Args:
             neworigin: Origin or Origin-derived object
         """
-       
-        # use _lca to find common ancestor and return tree to common
-        lca = self._lca(neworigin)
-        
-        # this will allows for the matrix math of the rotation to behave properly
-        self._translate(lca, neworigin)
 
-    def _translate(self, lca, neworigin):
+        self._translate(self._transform(neworigin), neworigin)
+
+    def _transform(self, neworigin):
+        """Homogeneous transform into the coordinate system of neworigin.
+
+        Composed from the cached transforms of the current and new
+        origins to the Center of the space, such that any redefinition
+        is a single matrix product independent of the depth of the
+        Origin tree.
+
+        Args:
+            neworigin: Origin or Origin-derived object
+
+        Returns:
+            numpy 4x4 array
+        """
+        return scipy.dot(neworigin._fromCenter(), self._origin._toCenter())
+
+    def _translate(self, trans, neworigin):
         """performs necessary rotations and translations of point.
 
         Args:
-            lca: tuple of Origins or Origin-derived Objects
-                Contains a tuple of Origins in order to common
-                ancestor of current Object and another tuple of 
-                Origins to the new base Origin (neworigin).
+            trans: numpy 4x4 array
+                Homogeneous transform from the current origin to
+                neworigin (see _transform).
              
             neworigin: Origin or Origin-derived object
                 New origin for the Point or Point-derived object.
 
         """
 
-        org = lca[0]
-        orgnew = lca[1]
         shape = self.unit.shape
         if len(shape) > 2:    
             sshape = self.s.shape
             self.s = self.s.flatten()
             self.unit = self.unit.reshape(3,old_div(self.unit.size,3))
 
-        # loop over the first 'path' of the current point
-        temp = Vec(self.unit,self.s,flag=self.flag)
-
-        for idx in range(len(org)-1,-1,-1):
-            # a origin's point is defined by its recursive coordinate system
-            # thus the value addition is not occuring in current origin system
-            # put in fact the coordinate system that defines the origin.
-            # thus this requires using the rotation matrix of the current origin
-            # system to define it in the 'parent' coordinate system
-            
-            temp = org[idx] + org[idx].rot(temp)
-            # vector addition is really tricky
-
-        for idx in range(len(orgnew)):
-            # the arot allows for translating into the current coordinate system
-            temp = orgnew[idx].arot(temp - orgnew[idx])
+        # a origin's point is defined by its recursive coordinate system,
+        # the composed transform maps it directly into that of neworigin
+        temp = self.unit*self.s
+        temp = Vecx(scipy.dot(trans[:3,:3], temp) + trans[:3,3].reshape((3,) + (1,)*(temp.ndim - 1)))
 
         # what is the vector which points from the new origin to the point?
         self._origin = neworigin
         self._depth = neworigin._depth + 1
-        # convert vector to proper coordinate system matching new origin and save
-        # arot forces the coordinate system to that of the new origin
         
         if len(shape) > 2:
             self.unit = temp.unit.reshape(shape)
@@ -1024,51 +1019,78 @@ class Origin(Point):
             neworigin: Origin or Origin-derived object
         """
 
-        lca = self._lca(neworigin)
-        super(Origin,self)._translate(lca, neworigin)
-        self._rotate(lca, neworigin)
+        trans = self._transform(neworigin)
+        super(Origin,self)._translate(trans, neworigin)
+        self._rotate(trans, neworigin)
+        self._cache = None
 
 
-    def _rotate(self, lca, neworigin):
+    def _rotate(self, trans, neworigin):
         """performs necessary rotations and translations of Origin.
 
         Origin or Origin-derived Object requires that the coordinate
         system basis vectors be accurately modified for the new
-        origin.  This requires a set of rotations and anti-rotations
-        through the lowest common ancestor.
+        origin.
 
         Args:
-            lca: tuple of Origins or Origin-derived Objects
-                Contains a tuple of Origins in order to common
-                ancestor of current Object and another tuple of 
-                Origins to the new base Origin (neworigin).
+            trans: numpy 4x4 array
+                Homogeneous transform from the current origin to
+                neworigin (see _transform).
              
             neworigin: Origin or Origin-derived object
                 New origin for the Point or Point-derived object.
 
         """
-        org = lca[0]
-        orgnew = lca[1]
-
-        temp1 = self.norm
-        temp2 = self.sagi
         mtemp = self.meri.s
 
-        for idx in range(len(org)-1,-1,-1):
-            # change the _rot coordinates to accurately reflect all of the necessary variation.
-            temp1 = org[idx].rot(temp1)
-            temp2 = org[idx].rot(temp2)
-
-        for idx in range(len(orgnew)):
-            # the arot allows for translating into the current coordinate system
-            temp1 = orgnew[idx].arot(temp1)
-            temp2 = orgnew[idx].arot(temp2)
-
-        self.norm = temp1
-        self.sagi = temp2
+        self.norm = _rotate(trans, self.norm)
+        self.sagi = _rotate(trans, self.sagi)
         self.meri = cross(self.norm, self.sagi)
         self.meri.s = mtemp
 
+    def _toCenter(self):
+        """Homogeneous transform from the coordinate system of the
+        Origin to that of the Center, composed through all parent
+        Origins. It is cached and only recomputed when the Origin
+        (spin, redefine) or one of its parents changes.
+
+        Returns:
+            numpy 4x4 array
+        """
+        self._checkCache()
+        return self._cache[1]
+
+    def _fromCenter(self):
+        """Homogeneous transform from the coordinate system of the
+        Center to that of the Origin (the composed arot), see _toCenter.
+
+        Returns:
+            numpy 4x4 array
+        """
+        self._checkCache()
+        return self._cache[2]
+
+    def _checkCache(self):
+        """ regenerates cached transforms if the Origin or the
+        transforms of its parent have changed"""
+        parent = self._origin._toCenter()
+        cache = getattr(self, '_cache', None)
+        if cache is None or not cache[0] is parent:
+            rot = scipy.array(self._rot)
+            pos = self.unit*self.s
+
+            temp = scipy.eye(4)
+            temp[:3,:3] = rot.T
+            temp[:3,3] = pos
+
+            atemp = scipy.eye(4)
+            atemp[:3,:3] = rot
+            atemp[:3,3] = -scipy.dot(rot, pos)
+
+            self._cache = (parent,
+                           scipy.dot(parent, temp),
+                           scipy.dot(atemp, self._origin._fromCenter()))
+
     def spin(self,angle):
         """Spin vector or vector-derived object around Origin
         about the cylindrical (0,0,1)/norm vector axis. This function
@@ -1080,6 +1102,7 @@ class Origin(Point):
         super(Point,self).spin(angle)
         self.sagi.spin(angle)
         self.meri.spin(angle)
+        self._cache = None
         
     def rot(self,vec):
         """Rotate input vector objects into coordinates of Origin.
@@ -1167,6 +1190,7 @@ class Center(Origin):
     _rot = [sagi.unit,
             meri.unit,
             norm.unit]
+    _eye = scipy.eye(4)
 
     def __init__(self, flag=True):
         """
@@ -1185,6 +1209,12 @@ class Center(Origin):
         # large number of empty values provide knowledge that there are no
         # lower references or rotations to this, the main coordinate system
 
+    def _toCenter(self):
+        return self._eye
+
+    def _fromCenter(self):
+        return self._eye
+
 def pts2Vec(pt1,pt2):
     """Returns a vector connecting to points.
 
@@ -1202,6 +1232,21 @@ def pts2Vec(pt1,pt2):
     else:
         raise ValueError("points must exist in same coordinate system")
 
+def _rotate(trans, vec):
+    """Rotates a Vec by the rotation of a homogeneous transform.
+
+    Args:
+        trans: numpy 4x4 array
+
+        vec: Vector object
+
+    Returns:
+        Vector object with the magnitude and flag of vec.
+    """
+    temp = Vec(scipy.dot(trans[:3,:3], vec.unit), vec.s)
+    temp.flag = vec.flag
+    return temp
+
 def fill(funtype, x0, x1, x2, *args, **kwargs):
     """Recursive function to generate TRIPPy Objects
 
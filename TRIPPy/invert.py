@@ -11,8 +11,13 @@ import scipy.interpolate
 import scipy.integrate
 import scipy.special
 import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+import numpy.polynomial.legendre
 import matplotlib.pyplot as plt
 import warnings
+import functools
+import multiprocessing
 import time as timer
 
 
@@ -66,89 +71,108 @@ def fluxFourierSens(beam, plasmameth, centermeth, time, points, mcos=[0], msin=[
                                         scipy.arange(len(points)),
                                         kind='cubic')
     length = len(points)
-  
+    width = length*len(mcos+msin)
+
     try:
+        beam.norm.s
+        single = True
+    except AttributeError:
+        single = False
+
+    # the sample points of all beams are concatenated such that the
+    # flux mapping and poloidal angle are evaluated once for all beams
+    temp, index, nbeam = _beamSamples(beam, ds)
+    output = scipy.zeros((len(time), nbeam*width))
+
+    mapped = scipy.atleast_2d(plasmameth(temp.r0(),
+                                         temp.x2(),
+                                         time))
+
+    # recover angles of each position in temp vector utlizing the t2 method
+    # to geometry.Vec improper vectorization strategy in t2 causes the use
+    # of a for loop
+    angle = scipy.zeros(mapped.shape)
+    for i in range(len(time)):
+        pt0 = centermeth(time[i])
+        angle[i] = temp.t2(pt0[0],pt0[1])
         
-        output = scipy.zeros((len(time),length*len(mcos+msin))) 
-        temp = beam(scipy.mgrid[beam.norm.s[-2]:beam.norm.s[-1]:ds])
-        
-        mapped = scipy.atleast_2d(plasmameth(temp.r0(),
-                                             temp.x2(),
-                                             time))
-
-        # recover angles of each position in temp vector utlizing the t2 method
-        # to geometry.Vec improper vectorization strategy in t2 causes the use
-        # of a for loop
-        angle = scipy.zeros(mapped.shape)
-        for i in range(len(time)):
-            pt0 = centermeth(time[i])
-            angle[i] = temp.t2(pt0[0],pt0[1])
-        
-        # knowing that the last point (point[-1]) is assumed to be a ZERO 
-        # emissivity point an additional brightness is added which only sees 
-        # the last emissivity to yield the zero
-        scipy.place(mapped, mapped > points[-1], points[-1])
-
-        if mapped.min() < 0:
-            warning.warn('chord measures at a parameter below point grid', RuntimeWarning)
-        # for a given point along a chord, use a spline to solve what 
-        # reconstruction points it is most close to. Then in the weighting
-        # matrix, (which is (brightness,points) in shape add the various 
-        # fractional weighting.
-        out = interp(mapped)
+    # knowing that the last point (point[-1]) is assumed to be a ZERO 
+    # emissivity point an additional brightness is added which only sees 
+    # the last emissivity to yield the zero
+    scipy.place(mapped, mapped > points[-1], points[-1])
+
+    if mapped.min() < 0:
+        warnings.warn('chord measures at a parameter below point grid', RuntimeWarning)
+    # for a given point along a chord, use a spline to solve what 
+    # reconstruction points it is most close to. Then in the weighting
+    # matrix, (which is (brightness,points) in shape add the various 
+    # fractional weighting.
+    out = interp(mapped)
         
-        # find out point using a floor like command (returns ints) 
-        idx1 = out.astype(int)
-        scipy.clip(idx1, 0, length-1, out=idx1)
+    # find out point using a floor like command (returns ints) 
+    idx1 = out.astype(int)
+    scipy.clip(idx1, 0, length-1, out=idx1)
 
-        idx2 = idx1 + 1
-        scipy.clip(idx2, 0, length-1, out=idx2)
+    idx2 = idx1 + 1
+    scipy.clip(idx2, 0, length-1, out=idx2)
 
-        # reduce out to the fraction in nearby bins
-        out = (out % 1.)*ds
-        lim = 0
+    # offset the indices to the row of the beam in the flattened
+    # [beam, radial x fourier components] output
+    idx1 += index*width
+    idx2 += index*width
 
-        for i in mcos:
-            angin = scipy.cos(i*angle)
-            #_beam.idx_add2(output[:,lim:lim+length],idx1,idx2,out,angin,ds)
-            _beam.idx_add(output,idx1,idx2,out,angin,ds,lim)
-            lim += length
+    # reduce out to the fraction in nearby bins
+    out = (out % 1.)*ds
+    lim = 0
 
-        for i in msin:
-            angin = scipy.sin(i*angle)
-            #_beam.idx_add2(output[:,lim:lim+length],idx1,idx2,out,angin,ds) 
-            _beam.idx_add(output,idx1,idx2,out,angin,ds,lim)
-            lim += length
+    for i in mcos:
+        angin = scipy.cos(i*angle)
+        _beam.idx_add(output,idx1,idx2,out,angin,ds,lim)
+        lim += length
 
-    except AttributeError:
-        output = scipy.zeros((len(time),len(beam),length*len(mcos+msin)))
-
-        #this for loop should be parallellized (well compartmentalized)
-        for i in range(len(beam)):
-            output[:,i,:] = fluxFourierSens(beam[i],
-                                            plasmameth,
-                                            centermeth,
-                                            time,
-                                            points,
-                                            mcos=mcos,
-                                            msin=msin,
-                                            ds=ds)
+    for i in msin:
+        angin = scipy.sin(i*angle)
+        _beam.idx_add(output,idx1,idx2,out,angin,ds,lim)
+        lim += length
+
+    output = output.reshape((len(time), nbeam, width))
+    if single:
+        output = output[:,0]
 
     return output
 
+
+def _beamSamples(beams, ds):
+    """ positions at step ds between the last two s values of every beam,
+    concatenated into a single Vec, with the beam index of each position
+    and the number of beams"""
+    pts = []
+    index = []
+    for i, (pt0, norm, s, etendue) in enumerate(beam._beamArrays(beams)):
+        temp = scipy.mgrid[s[-2]:s[-1]:ds]
+        pts += [pt0[:,scipy.newaxis] + norm[:,scipy.newaxis]*temp]
+        index += [scipy.ones(temp.shape, dtype=int)*i]
+
+    return (geometry.Vecx(scipy.concatenate(pts, axis=1)),
+            scipy.concatenate(index),
+            len(index))
+
 def fluxFourierSensRho(beams,plasma,time,points,mcos=[0],msin=[],ds=1e-3,meth='psinorm'):
     """Calculates the distance weight matrix for specified fourier components
 
     Similar to fluxFourierSens, it instead derives weightings from the plasma 
     equilibrium assuming that the plasma object contains a method .rz2rho. 
     It should return a value of normalized radius to some basis function
-    related to the plasma equilibrium.
+    related to the plasma equilibrium. The plasma center is taken from
+    plasma.center, and all beams and times are evaluated in a single
+    pass with the same weighting as fluxFourierSens.
 
 
     Args:
-        beams: geometry Object with reference origin
+        beams: Beam object, BeamArray or tuple of Beam objects
+            which have been traced through plasma.
 
-        plasma: geometry Object with reference origin
+        plasma: Tokamak object
         
         time:  equilibrium time for inversion
         
@@ -169,38 +193,14 @@ def fluxFourierSensRho(beams,plasma,time,points,mcos=[0],msin=[],ds=1e-3,meth='p
             The order of the last dimension is grouped by fourier
             component, cosine radial terms then sine radial terms.
     """
-    time = scipy.atleast_1d(time)
-    interp = scipy.interpolate.interp1d(points,scipy.arange(len(points)),kind='cubic')
-    
-    # initialize output array of sensitivities
-    output = scipy.zeros((len(time),len(beams),len(points)))
-
-    for i in range(len(beams)):
-        temp = beams[i](scipy.mgrid[beams[i].norm.s[-2]:beams[i].norm.s[-1]:step])
-        mapped = plasma.eq.rz2rho(meth,
-                                  temp.r0(),
-                                  temp.x2(),
-                                  scipy.array(time))
-
-        # knowing that the last point (point[-1]) is assumed to be a ZERO emissivity point,
-        #an additional brightness is added which only sees the last emissivity to yield the zero
-        scipy.place(mapped,mapped > points[-1], points[-1])
-       
-        # for a given point along a chord, use a spline to solve what reconstruction points
-        #it is most close to. Then in the weighting matrix, (which is (brightness,points) in shape add the various fractional weighting.
-        out = interp(mapped)
-        
-        # find out point using a floor like command (returns ints) 
-        idx = out.astype(int)
-
-        # reduce out to the fraction
-        out = (out % 1.)*step
-        for j in range(len(idx[0])):
-            output[:,i,idx[:,j]] += out[:,j]
-            scipy.place(idx[:,j], idx[:,j] < len(points)-1, idx[:,j]+1)
-            output[:,i,idx[:,j]] += step - out[:,j]
-
-    return output
+    return fluxFourierSens(beams,
+                           functools.partial(plasma.eq.rz2rho, meth),
+                           plasma.center,
+                           time,
+                           points,
+                           mcos=mcos,
+                           msin=msin,
+                           ds=ds)
 
 def besselFourierKernel(m, zero, rho):
     """ Function kernel for the bessel Fourier method inversion
@@ -232,11 +232,83 @@ def besselFourierKernel(m, zero, rho):
                                        scipy.arccos(rho),
                                        args = (m, zero, rho))[0]
 
+def besselFourierKernels(m, zeros, rho, order=64, table=None):
+    """ Vectorized kernel for the bessel Fourier method inversion
+
+    Evaluates besselFourierKernel for all harmonics, zeros and tangency
+    radii at once, replacing the adaptive quadrature with a fixed-order
+    Gauss-Legendre quadrature over theta in [0, arccos(rho)]. As the
+    integrand is analytic, the error decreases exponentially with the
+    order once the highest zero is resolved. Compared to 
+    besselFourierKernel (quad with tight tolerances), for m < 6 and the 
+    first 30 zeros of each harmonic over rho in [0, 1) the maximum 
+    absolute difference is 1e-15 at order=64, 4e-8 at order=48 and 
+    4e-2 at order=32 (the kernel is of order unity). Higher orders are
+    required for larger zeros.
+
+    Args:
+        m: array of harmonic numbers of length M.
+
+        zeros: (M,L) array of bessel zeros of each harmonic.
+        
+        rho: array of normalized tangency radii of length N.
+
+    Kwargs:
+        order: number of Gauss-Legendre points.
+
+        table: number of points of an optional table of the kernel,
+            uniformly spaced in arccos(rho), which is interpolated with
+            a cubic spline. This is faster for many tangency radii at
+            the cost of accuracy, a 1000 point table has errors of 
+            order 1e-9 for the first 15 zeros.
+
+    Returns:
+        numpy array: (N,M,L) array of kernel values.
+    
+    """
+    m = scipy.asarray(m, dtype=float)
+    zeros = scipy.atleast_2d(zeros)
+    rho = scipy.atleast_1d(rho)
+
+    if table is None:
+        return _besselFourierGauss(m, zeros, rho, order)
+
+    theta = scipy.linspace(0, scipy.pi/2, table)
+    interp = scipy.interpolate.interp1d(theta,
+                                        _besselFourierGauss(m,
+                                                            zeros,
+                                                            scipy.cos(theta),
+                                                            order),
+                                        kind='cubic',
+                                        axis=0)
+    return interp(scipy.arccos(scipy.clip(rho, 0., 1.)))
+
+def _besselFourierGauss(m, zeros, rho, order, size=2**20):
+    """ Gauss-Legendre quadrature of the bessel Fourier kernel, evaluated
+    in blocks of rho which limit the integrand to size elements"""
+    x, w = numpy.polynomial.legendre.leggauss(order)
+    jprime = (scipy.special.jn(m[:,scipy.newaxis] + 1, zeros) - 
+              scipy.special.jn(m[:,scipy.newaxis] - 1, zeros))
+    
+    m = m[:,scipy.newaxis,scipy.newaxis]
+    zeros = zeros[...,scipy.newaxis]
+    output = scipy.zeros((len(rho),) + jprime.shape)
+    step = max(old_div(size, jprime.size*order), 1)
+
+    for i in range(0, len(rho), step):
+        lim = scipy.arccos(rho[i:i+step])
+        theta = (lim[:,scipy.newaxis]*(x + 1)/2)[:,scipy.newaxis,scipy.newaxis]
+        temp = scipy.cos(m*theta)*scipy.sin(zeros*(scipy.cos(theta) - 
+                                                   rho[i:i+step,scipy.newaxis,scipy.newaxis,scipy.newaxis]))
+        output[i:i+step] = jprime*lim[:,scipy.newaxis,scipy.newaxis]*scipy.dot(temp, w)/2
+
+    return output
+
 def _bessel_fourier_kernel(theta,m,zero,rho):
     """ Depreciated, older, slower, version. See besselFourierKernel"""
     return scipy.cos(m*theta)*scipy.sin(zero*(scipy.cos(theta)-rho))
 
-def besselFourierSens(beam, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msin=[], rcond=2e-2):
+def besselFourierSens(beam, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msin=[], rcond=2e-2, order=64, table=None):
     """Calculates the distance weight matrix for specified fourier components
 
     This function is used directly for poloidal tomography exstensibly for 
@@ -264,6 +336,12 @@ def besselFourierSens(beam, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msi
         
         rcond:
 
+        order: number of Gauss-Legendre points of the kernel
+            (see besselFourierKernels)
+
+        table: number of points of the optional kernel table
+            (see besselFourierKernels)
+
     Returns:
         Vector object: Vector points from pt1 to pt2.
     
@@ -275,69 +353,188 @@ def besselFourierSens(beam, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msi
     for i in range(len(m)):
         zeros[i] = scipy.special.jn_zeros(m[i],zeros.shape[1])
 
-    kernel = scipy.zeros((len(m),length))
+    try:
+        beam.norm.s
+        beams = [beam]
+    except AttributeError:
+        beams = beam
 
-    # need to modify zeros
+    rcent = scipy.atleast_1d(rcent)
+    zcent = scipy.atleast_1d(zcent)
+    rmax = scipy.atleast_1d(rmax)*scipy.ones(rcent.shape)
 
+    # returns closest approach vector to plasma center mod for NSTX-U
+    # for every center and beam
     try:
-        try:
-            output = scipy.zeros((len(rcent), length*(len(mcos)+len(msin))))
-        except TypeError:
-            output = scipy.zeros((1, length*(len(mcos)+len(msin))))
-            rmax = scipy.atleast_1d(rmax)
-
+        beams.pt0
+    except AttributeError:
+        rho = scipy.zeros((len(rcent), len(beams)))
+        angle = scipy.zeros(rho.shape)
         for i in range(len(rcent)):
-            idx = 0
-            
-            # returns closest approach vector to plasma center mod for NSTX-U
-            
-            #temp = j(j.tmin(rcent,zcent)).t(rcent,zcent)
-            cent = geometry.Point(geometry.Vecr([rcent[i],0,zcent[i]]),beam._origin)
-            temp2 = beam(beam.smin(cent)) - cent
-            temp = [temp2.s,0,scipy.arctan2(temp2.x2(),temp2.x0())]
-            
-            #temp = beam(beam.tmin(rcent[i], zcent[i])).t(rcent[i], zcent[i])
-
-            if temp[0] > rmax[i]:
-                rho = 1.0
-                warnings.warn('chord outside of specified designated edge zero emissivity', RuntimeWarning)
-            else:
-                rho = old_div(temp[0],rmax[i])
-
-            for j in range(len(m)):
-                for k in range(length):
-                    kernel[j, k] = rmax[i]*besselFourierKernel(m[j],
-                                                               zeros[j,k],
-                                                               rho)
-            # fill sens matrix
-            for j in range(len(mcos)):
-                output[i, idx*length:(idx+1)*length] = scipy.cos(mcos[j]*temp[2])*kernel[scipy.where(m == mcos[j])]
-                idx += 1
-
-            for j in range(len(msin)):     
-                output[i, idx*length:(idx+1)*length] = scipy.sin(msin[j]*temp[2])*kernel[scipy.where(m == msin[j])]
-                idx += 1
-                    
+            for j in range(len(beams)):
+                cent = geometry.Point(geometry.Vecr([rcent[i],0,zcent[i]]),beams[j]._origin)
+                temp = beams[j](beams[j].smin(cent)) - cent
+                rho[i,j] = scipy.squeeze(temp.s)
+                angle[i,j] = scipy.squeeze(scipy.arctan2(temp.x2(),temp.x0()))
+    else:
+        # BeamArray, all centers and beams at once
+        temp = beams.pt0 - scipy.array([rcent, scipy.zeros(rcent.shape), zcent]).T[:,scipy.newaxis]
+        temp -= beams.norm*scipy.sum(temp*beams.norm, axis=-1)[...,scipy.newaxis]
+        rho = scipy.sqrt(scipy.sum(temp**2, axis=-1))
+        angle = scipy.arctan2(temp[...,2], temp[...,0])
+
+    rho = old_div(rho, rmax[:,scipy.newaxis])
+    if (rho > 1.).any():
+        warnings.warn('chord outside of specified designated edge zero emissivity', RuntimeWarning)
+        scipy.place(rho, rho > 1., 1.)
+
+    # evaluate the kernel for all tangency radii at once
+    kernel = besselFourierKernels(m, zeros, rho.ravel(), order=order, table=table)
+    kernel = rmax[:,scipy.newaxis,scipy.newaxis,scipy.newaxis]*kernel.reshape(rho.shape + zeros.shape)
+
+    # fill sens matrix
+    output = scipy.zeros((len(rcent), len(beams), length*len(mcos+msin)))
+    idx = 0
+    for j in range(len(mcos)):
+        output[...,idx*length:(idx+1)*length] = (scipy.cos(mcos[j]*angle)[...,scipy.newaxis]*
+                                                 kernel[:,:,scipy.where(m == mcos[j])[0][0]])
+        idx += 1
+
+    for j in range(len(msin)):     
+        output[...,idx*length:(idx+1)*length] = (scipy.sin(msin[j]*angle)[...,scipy.newaxis]*
+                                                 kernel[:,:,scipy.where(m == msin[j])[0][0]])
+        idx += 1
+
+    if beams is beam:
         return output
+    else:
+        return output[:,0]
 
-    except AttributeError:
-        #implement parallelization here
-        output = scipy.zeros((len(rcent),
-                              len(beam),
-                              length*len(mcos+msin)))
-        
-        for i in range(len(beam)):
-            output[:,i,:] += besselFourierSens(beam[i],
-                                               rcent,
-                                               zcent,
-                                               rmax,
-                                               l=l,
-                                               mcos=mcos,
-                                               msin=msin)
+    
+def parallelSens(func, beams, *args, **kwargs):
+    """Builds a sensitivity matrix in parallel over a process pool
+
+    The beams (or the time slices) are split into contiguous shards
+    which are evaluated by func in a concurrent.futures process pool.
+    The beam geometry, func and its arguments (including the
+    equilibrium through plasmameth or similar) are handed to each
+    worker once through the pool initializer, and every shard is
+    written into a preallocated shared memory output. As each beam
+    and time slice is computed independently, the result is bitwise
+    identical to the serial call func(beams, *args, **kwargs).
+    Requires Python 3.7+ and picklable func and arguments (module
+    level functions or bound methods, not lambdas).
 
-        return output
+    Args:
+        func: sensitivity function of the form
+            func(beams, *args, **kwargs) which returns a
+            [time,beam,basis] array (fluxFourierSens, besselFourierSens)
+
+        beams: Beam, BeamArray or nested iterable of beams.
+
+        *args: positional arguments of func after beams.
+
+    Kwargs:
+        workers: number of worker processes, defaults to the number of
+            cpus.
+
+        chunks: number of shards, defaults to 4 per worker.
+
+        timeargs: indices into args of the time-like arrays (time for
+            fluxFourierSens, rcent, zcent and rmax for besselFourierSens).
+            When specified the time slices are sharded instead of the
+            beams.
+
+        **kwargs: keyword arguments of func.
+
+    Returns:
+        output: A 3-dimensional array [time,beam,basis] matching func.
+
+    Examples:
+        Build a fluxFourierSens matrix on 8 processes::
+
+            sens = parallelSens(fluxFourierSens,
+                                beams,
+                                tok.eq.rz2psinorm,
+                                tok.center,
+                                time,
+                                points,
+                                workers=8)
+    """
+    import concurrent.futures
+
+    workers = kwargs.pop('workers', None)
+    chunks = kwargs.pop('chunks', None)
+    timeargs = kwargs.pop('timeargs', None)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if chunks is None:
+        chunks = 4*workers
+
+    if not isinstance(beams, beam.BeamArray):
+        beams = beam._flatten(beams)
+
+    # evaluate the size of the basis from the first beam and time slice
+    temp = func(beams[0:1], *_sliceArgs(args, timeargs, 0, 1), **kwargs)
+    if timeargs is None:
+        shape = (temp.shape[0], len(beams), temp.shape[-1])
+        length = shape[1]
+    else:
+        shape = (len(args[timeargs[0]]), len(beams), temp.shape[-1])
+        length = shape[0]
+
+    output = multiprocessing.RawArray('d', int(scipy.prod(shape)))
+    bounds = scipy.unique(scipy.linspace(0, length, min(chunks, length) + 1).astype(int))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=_parallelInit,
+                                                initargs=(output,
+                                                          shape,
+                                                          func,
+                                                          beams,
+                                                          args,
+                                                          kwargs,
+                                                          timeargs)) as pool:
+        # list forces any exception of the workers to be raised
+        list(pool.map(_parallelSens, bounds[:-1], bounds[1:]))
+
+    return scipy.frombuffer(output).reshape(shape)
+
+_parallelState = {}
+
+def _parallelInit(output, shape, func, beams, args, kwargs, timeargs):
+    """ stores the read-only inputs and shared output in the worker"""
+    _parallelState.update(output=scipy.frombuffer(output).reshape(shape),
+                          func=func,
+                          beams=beams,
+                          args=args,
+                          kwargs=kwargs,
+                          timeargs=timeargs)
+
+def _parallelSens(start, stop):
+    """ evaluates a shard of beams or time slices into the shared output"""
+    state = _parallelState
+    args = _sliceArgs(state['args'], state['timeargs'], start, stop)
+
+    if state['timeargs'] is None:
+        state['output'][:,start:stop] = state['func'](state['beams'][start:stop],
+                                                      *args,
+                                                      **state['kwargs'])
+    else:
+        state['output'][start:stop] = state['func'](state['beams'],
+                                                    *args,
+                                                    **state['kwargs'])
+
+def _sliceArgs(args, timeargs, start, stop):
+    """ returns args with the time-like arguments sliced"""
+    args = list(args)
+    if not timeargs is None:
+        for i in timeargs:
+            args[i] = args[i][start:stop]
+    return args
 
-    
 def bFInvert(beams, bright, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msin=[], zeros=None, plasma=None, rcond=2e-2, out=False):
     """Bessel/Fourier inversion function for a given center, chords and brightnesses.
 
@@ -410,14 +607,638 @@ def bFInvert(beams, bright, rcent, zcent, rmax, l=list(range(15)), mcos=[0], msi
     else:
         return output
 
+def pixelInvert(beams, bright, plasma, rgrid=None, zgrid=None, smooth=0., damp=0., method='lsqr', sens=None, out=False, **kwargs):
+    r"""Pixel based inversion on a poloidal (R,Z) grid.
+
+    Solves the regularized least squares problem for the emissivity x
+    of each pixel of Tokamak.gridWeight
+
+    .. math::
+        \min ||Wx - b||^2 + smooth^2||Lx||^2 + damp^2||x||^2
+
+    where W is the sparse geometry matrix, b the normalized brightness
+    (4*pi*bright/etendue, as in bFInvert) and L the discrete Laplacian
+    of the pixel grid. Iterative sparse solvers are used such that the
+    dense normal matrix is never formed, allowing for millimeter 
+    resolution grids.
+
+    Args:
+        beams: Beam object, BeamArray or tuple of Beam objects
+            which have been traced through plasma.
+
+        bright: (chords,) or (chords,times) array of brightnesses.
+
+        plasma: Tokamak object.
+
+    Kwargs:
+        rgrid: R pixel centers in meters, defaults to the 
+            equilibrium R grid.
+
+        zgrid: Z pixel centers in meters, defaults to the 
+            equilibrium Z grid.
+
+        smooth: float - weight of the Laplacian smoothing.
+
+        damp: float - weight of the zeroth order (Tikhonov) damping.
+
+        method: 'lsqr' (scipy.sparse.linalg.lsqr) or 'cgls'.
+
+        sens: geometry matrix of Tokamak.gridWeight with 
+            etendue=False, which is generated if not specified.
+
+        out: bool - return the geometry matrix as well.
+
+        **kwargs: passed to the solver (iter_lim, atol, btol for
+            lsqr, iter_lim and tol for cgls).
+
+    Returns:
+        numpy array: (len(rgrid),len(zgrid)[,times]) emissivities, 
+            and the geometry matrix if out is True.
+    """
+    if rgrid is None:
+        rgrid = plasma.eq.getRGrid()
+
+    if zgrid is None:
+        zgrid = plasma.eq.getZGrid()
+
+    if sens is None:
+        sens = plasma.gridWeight(beams, rgrid=rgrid, zgrid=zgrid, etendue=False)
+
+    etendue = scipy.array([scipy.squeeze(i[3]) for i in beam._beamArrays(beams)])
+    bright = scipy.asarray(bright, dtype=float)
+    # chords without etendue (subBeam segments outside of their surface)
+    # have zero rows in sens, and are masked
+    good = etendue > 0
+    bright = (scipy.where(good, 4*scipy.pi/scipy.where(good, etendue, 1.), 0.)*bright.T).T
+    shape = (len(rgrid), len(zgrid))
+
+    # augment the system with the regularization operators
+    system = [sens]
+    if smooth:
+        system += [smooth*_laplacian(shape)]
+    if damp and method == 'cgls':
+        system += [damp*scipy.sparse.identity(sens.shape[1])]
+    system = scipy.sparse.vstack(system).tocsr()
+    
+    temp = scipy.zeros((system.shape[0],))
+    output = scipy.zeros((sens.shape[1],) + bright.shape[1:])
+    for i in scipy.ndindex(bright.shape[1:]):
+        temp[:sens.shape[0]] = bright[(slice(None),) + i]
+        if method == 'lsqr':
+            output[(slice(None),) + i] = scipy.sparse.linalg.lsqr(system, temp, damp=damp, **kwargs)[0]
+        elif method == 'cgls':
+            output[(slice(None),) + i] = _cgls(system, temp, **kwargs)
+        else:
+            raise ValueError("method must be 'lsqr' or 'cgls'")
+
+    output = output.reshape(shape + bright.shape[1:])
+    if out:
+        return output, sens
+    else:
+        return output
+
+def _laplacian(shape):
+    """ sparse discrete Laplacian of a 2d grid, flattened in C order"""
+    output = []
+    for i in range(len(shape)):
+        diff = scipy.sparse.diags([scipy.ones((shape[i]-1,)),
+                                   -2*scipy.ones((shape[i],)),
+                                   scipy.ones((shape[i]-1,))],
+                                  [-1, 0, 1])
+        temp = [scipy.sparse.identity(j) for j in shape]
+        temp[i] = diff
+        output += [scipy.sparse.kron(temp[0], temp[1])]
+    return (output[0] + output[1]).tocsr()
+
+def _cgls(system, bright, iter_lim=None, tol=1e-8):
+    """ conjugate gradient least squares solution of system x = bright"""
+    if iter_lim is None:
+        iter_lim = 2*system.shape[1]
+
+    output = scipy.zeros((system.shape[1],))
+    resid = bright.copy()
+    grad = system.T.dot(resid)
+    step = grad.copy()
+    gamma = scipy.dot(grad, grad)
+    lim = tol**2*gamma
+
+    for i in range(iter_lim):
+        if gamma <= lim or gamma == 0:
+            break
+        temp = system.dot(step)
+        alpha = old_div(gamma, scipy.dot(temp, temp))
+        output += alpha*step
+        resid -= alpha*temp
+        grad = system.T.dot(resid)
+        gnew = scipy.dot(grad, grad)
+        step = grad + old_div(gnew, gamma)*step
+        gamma = gnew
+
+    return output
+
+class ForwardModel(object):
+    """Synthetic diagnostic of traced beams.
+
+    The weight of each chord on a set of emissivity basis functions, 
+    either radial flux-surface points (as in fluxFourierSens) or (R,Z)
+    pixels (as in Tokamak.gridWeight), is computed once and stored as
+    a sparse matrix, such that the brightness of any number of 
+    emissivity profiles is a single sparse-dense matrix product.
+
+    Args:
+        beams: Beam object, BeamArray or tuple of Beam objects
+            which have been traced through plasma.
+
+        plasma: Tokamak object.
+
+    Kwargs:
+        points: points in radial sinogram in which to map to, if
+            specified the flux-surface basis is used.
+
+        time: equilibrium times of the flux-surface basis.
+
+        method: normalization method (psinorm,phinorm,volnorm) of
+            the flux-surface basis passed to rz2rho.
+
+        plasmameth: flux-based radial method, which replaces method
+            (for example a Tokamak.fluxMap).
+
+        mcos: cosine fourier components of the flux-surface basis.
+
+        msin: sine fourier components of the flux-surface basis.
+        
+        ds: step size along the beams in meters of the flux-surface 
+            basis.
+
+        rgrid: R pixel centers in meters of the pixel basis, 
+            defaults to the equilibrium R grid.
+
+        zgrid: Z pixel centers in meters of the pixel basis, 
+            defaults to the equilibrium Z grid.
+
+    Examples:
+        Brightness of K profiles on 50 normalized flux points::
+
+            model = ForwardModel(beams, tok, points=scipy.linspace(0,1,50), time=1.)
+            bright = model(emiss) # emiss is (50,K), bright is (beams,K)
+    """
+
+    def __init__(self, beams, plasma, points=None, time=None, method='psinorm', plasmameth=None, mcos=[0], msin=[], ds=1e-3, rgrid=None, zgrid=None):
+        etendue = scipy.array([scipy.squeeze(i[3]) for i in beam._beamArrays(beams)])
+        scale = scipy.sparse.diags(etendue/(4*scipy.pi))
+
+        if points is None:
+            sens = [plasma.gridWeight(beams, rgrid=rgrid, zgrid=zgrid, etendue=False)]
+        else:
+            if plasmameth is None:
+                plasmameth = functools.partial(plasma.eq.rz2rho, method)
+
+            sens = fluxFourierSens(beam._flatten(beams),
+                                   plasmameth,
+                                   plasma.center,
+                                   time,
+                                   points,
+                                   mcos=mcos,
+                                   msin=msin,
+                                   ds=ds)
+            sens = [scipy.sparse.csr_matrix(i) for i in sens]
+        
+        self.time = time
+        self.sens = [scale.dot(i).tocsr() for i in sens]
+
+    def __call__(self, emiss, idx=0):
+        """Brightness of emissivity profiles.
+
+        Args:
+            emiss: (basis,) or (basis,K) array of emissivities.
+
+        Kwargs:
+            idx: index of the equilibrium time for the flux-surface basis.
+
+        Returns:
+            numpy array: (beams,) or (beams,K) brightnesses.
+        """
+        return self.sens[idx].dot(emiss)
+
+class BFInversion(object):
+    """Cached Bessel/Fourier inversion for a fixed set of chords.
+
+    Equivalent to bFInvert for a single center, the singular value
+    decomposition of the sensitivity matrix is computed once for the
+    chords, basis and plasma center and stored, such that time series
+    of brightnesses are inverted with a single matrix product by the
+    truncated pseudoinverse. The decomposition is only recomputed when
+    the plasma center moves by more than tol.
+
+    Args:
+        beams: Beam, BeamArray or nested iterable of beams.
+
+        rmax: radius of the edge zero emissivity in meters.
+
+    Kwargs:
+        l: list of bessel zeros to use for each harmonic.
+
+        mcos: cosine fourier harmonics.
+
+        msin: sine fourier harmonics.
+
+        zeros: number of forced zero chords outside the vessel,
+            requires plasma.
+
+        plasma: Tokamak object for the forced zero chords.
+
+        rcond: float - conditioning value for pseudoinverse truncation
+
+        alpha: float - Tikhonov regularization parameter, which 
+            replaces the truncation by rcond when specified.
+
+        tol: distance in meters the plasma center may move before the
+            decomposition is recomputed.
+
+        order: number of Gauss-Legendre points of the kernel
+            (see besselFourierKernels)
+
+        table: number of points of the optional kernel table
+            (see besselFourierKernels)
+
+    Examples:
+        Invert a (chords,times) brightness array::
+
+            inv = BFInversion(beams, .22, mcos=[0,1], msin=[1])
+            emiss = inv(bright, rcent, zcent)
+    """
+
+    def __init__(self, beams, rmax, l=list(range(15)), mcos=[0], msin=[], zeros=None, plasma=None, rcond=2e-2, alpha=None, tol=1e-3, order=64, table=None):
+        self.beams = beam._flatten(beams)
+        self.rmax = rmax
+        self.l = l
+        self.mcos = mcos
+        self.msin = msin
+        self.zeros = zeros
+        self.plasma = plasma
+        self.rcond = rcond
+        self.alpha = alpha
+        self.tol = tol
+        self.order = order
+        self.table = table
+
+        # brightness normalization of each chord
+        self._scale = 4*scipy.pi/scipy.array([scipy.squeeze(i.etendue) for i in self.beams])
+        self._center = None
+        self._pinv = None
+
+    def sens(self, rcent, zcent):
+        """Sensitivity matrix of the chords (and forced zero chords)
+        for a plasma center.
+
+        Args:
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Returns:
+            numpy array: (chords, basis) sensitivity matrix.
+        """
+        self._update(rcent, zcent)
+        return self._sens
+
+    def svd(self, rcent, zcent):
+        """Cached singular value decomposition of the sensitivity matrix.
+
+        Args:
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Returns:
+            (u, s, vt) tuple of scipy.linalg.svd with full_matrices=False.
+        """
+        self._update(rcent, zcent)
+        return self._svd
+
+    def pinv(self, rcent, zcent):
+        """Truncated pseudoinverse of the sensitivity matrix, singular
+        values below rcond times the largest are discarded (or the 
+        Tikhonov regularized inverse if alpha is specified).
+
+        Args:
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Returns:
+            numpy array: (basis, chords) pseudoinverse.
+        """
+        self._update(rcent, zcent)
+        key = (self.rcond, self.alpha)
+        if self._pinv is None or self._pinv[0] != key:
+            u, s, vt = self._svd
+            if self.alpha is None:
+                coef = _filterCoef(s, rcond=[self.rcond])[0]
+            else:
+                coef = _filterCoef(s, alpha=[self.alpha])[0]
+            self._pinv = (key, scipy.dot(vt.T*coef, u.T))
+        return self._pinv[1]
+
+    def sweep(self, bright, rcent, zcent, rcond=None, alpha=None):
+        """Inverts brightnesses for many regularization levels from the
+        single cached decomposition.
+
+        Args:
+            bright: (chords,) or (chords,times) array of brightnesses.
+
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Kwargs:
+            rcond: array of truncation levels.
+
+            alpha: array of Tikhonov regularization parameters, used
+                if rcond is not specified.
+
+        Returns:
+            (emiss, residual, error) tuple of numpy arrays, the 
+            emissivities (levels,basis[,times]), the norm of the 
+            residual of the normalized brightness (levels[,times]),
+            and the uncertainty of the emissivities in the form of 
+            err (levels,basis[,times]), using the covariance of the
+            regularized inverse.
+        """
+        emiss, residual, norm, var = self._sweep(bright, rcent, zcent, rcond, alpha)
+
+        # degrees of freedom as in err
+        dof = len(self.beams) - emiss.shape[1]
+        shape = (var.shape + (1,)*(residual.ndim - 1))
+        error = scipy.sqrt(abs(old_div((residual**2)[:,scipy.newaxis]*var.reshape(shape), dof)))
+
+        return emiss, residual, error
+
+    def lcurve(self, bright, rcent, zcent, rcond=None, alpha=None):
+        """Selects the regularization level at the corner (maximum
+        curvature) of the L-curve, the log of the solution norm versus
+        the log of the residual norm. For multiple time slices the 
+        norms are taken over all times.
+
+        Args:
+            bright: (chords,) or (chords,times) array of brightnesses.
+
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Kwargs:
+            rcond: array of truncation levels.
+
+            alpha: array of Tikhonov regularization parameters, used
+                if rcond is not specified.
+
+        Returns:
+            value of rcond or alpha at the corner of the L-curve.
+        """
+        level = _sweepLevel(rcond, alpha)
+        emiss, residual, norm, var = self._sweep(bright, rcent, zcent, rcond, alpha)
+        residual = scipy.sqrt(scipy.sum(residual.reshape((len(level), -1))**2, axis=1))
+        norm = scipy.sqrt(scipy.sum(norm.reshape((len(level), -1))**2, axis=1))
+
+        # increasing regularization traces the L-curve such that the
+        # corner has a positive curvature
+        idx = scipy.argsort(level)
+        x = scipy.log(residual[idx])
+        y = scipy.log(norm[idx])
+        dx = scipy.gradient(x)
+        dy = scipy.gradient(y)
+        curve = old_div(dx*scipy.gradient(dy) - dy*scipy.gradient(dx), (dx**2 + dy**2)**1.5)
+        return level[idx][scipy.nanargmax(curve)]
+
+    def gcv(self, bright, rcent, zcent, rcond=None, alpha=None):
+        """Selects the regularization level which minimizes the
+        generalized cross validation function, the squared residual
+        norm divided by the squared trace of one minus the influence
+        matrix. For multiple time slices the residual is summed over 
+        all times.
+
+        Args:
+            bright: (chords,) or (chords,times) array of brightnesses.
+
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Kwargs:
+            rcond: array of truncation levels.
+
+            alpha: array of Tikhonov regularization parameters, used
+                if rcond is not specified.
+
+        Returns:
+            value of rcond or alpha which minimizes the GCV function.
+        """
+        level = _sweepLevel(rcond, alpha)
+        emiss, residual, norm, var = self._sweep(bright, rcent, zcent, rcond, alpha)
+        u, s, vt = self._svd
+        trace = len(u) - scipy.sum(_filterFactor(s, rcond, alpha), axis=1)
+        gcv = old_div(scipy.sum(residual.reshape((len(level), -1))**2, axis=1), trace**2)
+        return level[scipy.argmin(gcv)]
+
+    def _sweep(self, bright, rcent, zcent, rcond, alpha):
+        """ emissivities, residual norms, solution norms and the
+        diagonal of the covariance of the regularized inverse for
+        each regularization level"""
+        u, s, vt = self.svd(rcent, zcent)
+        bright = self._normalize(bright)
+        
+        # project brightness onto the left singular vectors, the 
+        # forced zero chords have zero brightness
+        proj = scipy.dot(u[:len(self.beams)].T, bright)
+        factor = _filterFactor(s, rcond, alpha)
+        coef = _filterCoef(s, rcond, alpha)
+
+        shape = factor.shape + (1,)*(bright.ndim - 1)
+        temp = coef.reshape(shape)*proj
+        emiss = scipy.einsum('ji,kj...->ki...', vt, temp)
+        norm = scipy.sqrt(scipy.sum(temp**2, axis=1))
+
+        # residual within and outside of the range of the sensitivity matrix
+        residual = (scipy.sum(((1 - factor).reshape(shape)*proj)**2, axis=1) + 
+                    scipy.sum(bright**2, axis=0) - scipy.sum(proj**2, axis=0))
+        residual = scipy.sqrt(abs(residual))
+
+        var = scipy.dot(coef**2, vt**2)
+        return emiss, residual, norm, var
+
+    def __call__(self, bright, rcent, zcent):
+        """Inverts brightnesses for the plasma center.
+
+        Args:
+            bright: (chords,) or (chords,times) array of brightnesses.
+
+            rcent: R of the plasma center in meters.
+
+            zcent: Z of the plasma center in meters.
+
+        Returns:
+            numpy array: (basis,) or (basis,times) array of emissivities.
+        """
+        pinv = self.pinv(rcent, zcent)
+
+        # forced zero chords have zero brightness and do not contribute
+        return scipy.dot(pinv[:,:len(self.beams)], self._normalize(bright))
+
+    def stream(self, bright, rcent, zcent, chunk=4096, error=True):
+        """Inverts a long brightness record in time chunks.
+
+        A generator which reads the brightness a chunk of time slices 
+        at a time, such that the memory is bounded by the chunk size
+        and the cached decomposition is reused across chunks. It is
+        only recomputed where the plasma center moves beyond tol.
+
+        Args:
+            bright: (chords,times) array, numpy memmap, the filename of
+                a .npy file (which is memory mapped) or an iterable of
+                (chords,times) arrays.
+
+            rcent: R of the plasma center in meters, either a float or
+                an array with a value for every time slice.
+
+            zcent: Z of the plasma center in meters, either a float or
+                an array with a value for every time slice.
+
+        Kwargs:
+            chunk: number of time slices per chunk for array inputs.
+
+            error: evaluate the uncertainty of the emissivities in the
+                form of err, using the covariance of the regularized
+                inverse.
+
+        Yields:
+            (emiss, error) tuple of (basis,times) arrays for each chunk,
+            error is None if not evaluated.
+
+        Examples:
+            Invert a memory mapped record::
+
+                for emiss, error in inv.stream('bright.npy', rcent, zcent):
+                    ...
+        """
+        if isinstance(bright, str):
+            bright = scipy.load(bright, mmap_mode='r')
+
+        rcent = scipy.atleast_1d(rcent)
+        zcent = scipy.atleast_1d(zcent)
+        offset = 0
+        for temp in _chunks(bright, chunk):
+            temp = scipy.asarray(temp, dtype=float)
+            size = temp.shape[1]
+            if rcent.size > 1:
+                rtemp = rcent[offset:offset + size]
+                ztemp = zcent[offset:offset + size]
+            else:
+                rtemp = rcent*scipy.ones((size,))
+                ztemp = zcent*scipy.ones((size,))
+
+            yield self._chunk(temp, rtemp, ztemp, error)
+            offset += size
+
+    def _chunk(self, bright, rcent, zcent, error):
+        """ inverts a chunk of time slices, splitting it where the
+        center moves beyond the tolerance of the cached decomposition"""
+        bright = self._normalize(bright)
+        emiss = scipy.zeros((len(self.l)*len(self.mcos + self.msin), bright.shape[1]))
+        if error:
+            output = scipy.zeros(emiss.shape)
+        else:
+            output = None
+
+        start = 0
+        while start < bright.shape[1]:
+            self._update(rcent[start], zcent[start])
+            near = scipy.hypot(rcent[start:] - self._center[0],
+                               zcent[start:] - self._center[1]) <= self.tol
+            stop = start + (len(near) if near.all() else scipy.argmin(near))
+
+            pinv = self.pinv(rcent[start], zcent[start])
+            emiss[:,start:stop] = scipy.dot(pinv[:,:len(self.beams)], bright[:,start:stop])
+
+            if error:
+                residual = scipy.sum((scipy.dot(self._sens[:len(self.beams)], emiss[:,start:stop]) -
+                                      bright[:,start:stop])**2, axis=0)
+                var = scipy.sum(pinv**2, axis=1)
+                output[:,start:stop] = scipy.sqrt(abs(old_div(var[:,scipy.newaxis]*residual, 
+                                                              len(self.beams) - len(var))))
+            start = stop
+
+        return emiss, output
+
+    def _normalize(self, bright):
+        """ scales the brightness to the sensitivity matrix units"""
+        bright = scipy.asarray(bright)
+        return (self._scale*bright.T).T
+
+    def _update(self, rcent, zcent):
+        """ recomputes the sensitivity matrix and its decomposition
+        if the center has moved beyond the tolerance"""
+        if (self._center is None or 
+            scipy.hypot(rcent - self._center[0], zcent - self._center[1]) > self.tol):
+
+            beams = list(self.beams)
+            if (not self.plasma is None) and (not self.zeros is None):
+                beams += beam._genBFEdgeZero(self.plasma, self.zeros, rcent, zcent)
+
+            self._sens = besselFourierSens(beams,
+                                           rcent,
+                                           zcent,
+                                           self.rmax,
+                                           l=self.l,
+                                           mcos=self.mcos,
+                                           msin=self.msin,
+                                           order=self.order,
+                                           table=self.table)[0]
+            self._svd = scipy.linalg.svd(self._sens, full_matrices=False)
+            self._center = (rcent, zcent)
+            self._pinv = None
+
+def _chunks(bright, chunk):
+    """ yields (chords,times) chunks of an array or iterable"""
+    try:
+        bright.shape
+    except AttributeError:
+        for temp in bright:
+            yield scipy.atleast_2d(scipy.asarray(temp).T).T
+    else:
+        bright = bright.reshape((len(bright), -1))
+        for i in range(0, bright.shape[1], chunk):
+            yield bright[:,i:i + chunk]
+
+def _sweepLevel(rcond, alpha):
+    """ array of regularization levels of a sweep"""
+    if rcond is None:
+        if alpha is None:
+            raise ValueError("rcond or alpha must be specified")
+        return scipy.atleast_1d(alpha)
+    return scipy.atleast_1d(rcond)
+
+def _filterFactor(s, rcond=None, alpha=None):
+    """ filter factors of the singular values s for each truncation
+    level rcond or Tikhonov parameter alpha, (levels, len(s))"""
+    if rcond is None:
+        alpha = _sweepLevel(rcond, alpha)[:,scipy.newaxis]
+        return old_div(s**2, s**2 + alpha**2)
+    rcond = _sweepLevel(rcond, alpha)[:,scipy.newaxis]
+    return (s > rcond*s[0]).astype(float)
+
+def _filterCoef(s, rcond=None, alpha=None):
+    """ filter factors divided by the singular values"""
+    factor = _filterFactor(s, rcond, alpha)
+    return scipy.where(factor > 0, old_div(factor, scipy.where(s > 0, s, 1.)), 0.)
+
 def cov(sens):
     return scipy.linalg.pinv(scipy.dot(sens.T,sens),rcond=2e-2)
 
 def err(emiss, bright, sens, beams, num=None):
     """ returns the error of emiss"""
-    temp2 = bright[:]
-    for i in range(len(temp2)):
-        temp2[i] *= 4*scipy.pi/beams[i].etendue
+    etendue = scipy.array([scipy.squeeze(beams[i].etendue) for i in range(len(bright))])
+    temp2 = (4*scipy.pi*scipy.asarray(bright).T/etendue).T
     temp = scipy.sum((scipy.dot(sens,emiss)[0:len(bright)]-temp2)**2)
     var = cov(sens)
     if num is None:
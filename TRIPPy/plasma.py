@@ -8,7 +8,12 @@ try:
 except:
     import eqtools
 from . import surface
+from . import beam
 import scipy.linalg
+import scipy.sparse
+import scipy.interpolate
+import warnings
+import collections
 from . import _beam
 
 class Tokamak(geometry.Center):
@@ -35,6 +40,12 @@ class Tokamak(geometry.Center):
     Kwargs:
         flag: Origin object.
             Sets the default coordinate nature 
+
+        wall: Wall object.
+            Toroidally varying first wall and in-vessel components
+            (ports, antennas, limiters), which clip the rays traced
+            through the axisymmetric vessel. The machine cross-section
+            of the equilibrium remains the fast default if None.
                 
     Examples:   
         Accepts all array like (tuples included) inputs, though
@@ -53,11 +64,17 @@ class Tokamak(geometry.Center):
                 cent = Center() #implicitly in cyl. coords.
                 vec2 = Vec(vec1, ref=cent)
     """
+
+    # version of the results of trace, part of the key of
+    # beam.cachedBeam. Increment whenever trace, _traceArrays or the
+    # intercept kernels change the traced s values.
+    _traceVersion = 1
     
-    def __init__(self, equilib, flag=True):
+    def __init__(self, equilib, flag=True, wall=None):
         """
         """
         self.eq = equilib
+        self.wall = wall
         super(Tokamak, self).__init__(flag=flag)
         self.meri.s = self.eq.getMachineCrossSection()[0] #store R and Z of limiter structure vacuum vessel
         self.sagi.s = self.meri.s #link together.
@@ -81,48 +98,252 @@ class Tokamak(geometry.Center):
         return geometry.Point(self.norm+self.sagi,self)
 
     def trace(self, ray, limiter=0):
+        """Traces Ray or Beam objects to the vacuum vessel/limiter
+
+        All rays are gathered into contiguous (N,3) arrays of origins
+        and directions such that each intercept pass is a single call
+        to the _beam.interceptCyl kernel. The resulting intercepts are
+        appended to the norm.s of each object. If the Tokamak has a 3D
+        wall, the rays are stopped at its first intercept within the
+        vessel.
+
+        Args:
+            ray: Ray, Beam or beam.subBeam object, an arbitrarily
+                nested iterable of these or a beam.BeamArray.
+
+        Kwargs:
+            limiter: int or array-like of ints.
+                Number of additional intersections to skip, used when
+                the actual plasma vessel structure is not as described
+                in the eqdsk. An array-like sets this value per ray
+                following the flattened order of ray.
+        """
+        if isinstance(ray, beam.subBeam):
+            # all sub-chords are traced in place
+            if not ray._origin is self:
+                ray.redefine(self)
+
+            pt0, norm, s, etendue = ray._arrays()
+            intersect1, intersect2, slast = self._traceArrays(pt0,
+                                                              norm,
+                                                              s[:,-1],
+                                                              limiter)
+            ray._append(intersect1, intersect2)
+            ray.norm.s[-1] = slast.reshape(ray.s.shape)
+            return
+
         try:
+            ray.pt0
+        except AttributeError:
+            # per ray limiter values follow the flattened order of ray
+            limiter = scipy.array(limiter, dtype=int)
+            rays = []
+            index = []
+            start = 0
+            for i in beam._flatten(ray, arrays=True):
+                if isinstance(i, (beam.BeamArray, beam.subBeam)):
+                    if limiter.ndim:
+                        self.trace(i, limiter=limiter[start:start + len(i)])
+                    else:
+                        self.trace(i, limiter=limiter)
+                    start += len(i)
+                else:
+                    rays += [i]
+                    index += [start]
+                    start += 1
 
-        # norm vector is modfied following the convention set in geometry.Origin
+            if limiter.ndim:
+                limiter = limiter[index]
+        else:
+            # BeamArray objects are traced in place
             if not ray._origin is self:
                 ray.redefine(self)
-                
-            invesselflag = self.inVessel(ray.r()[...,-1])
-            
-            intersect = _beam.interceptCyl(scipy.atleast_2d(ray.x()[:,-1]), 
-                                           scipy.atleast_2d(ray.norm.unit), 
-                                           self.meri.s,
-                                           self.norm.s) + ray.norm.s[-1]
-            if scipy.isfinite(intersect):
-                ray.norm.s = scipy.append(ray.norm.s,intersect)
-
-            intersect = _beam.interceptCyl(scipy.atleast_2d(ray.x()[:,-1]),
-                                           scipy.atleast_2d(ray.norm.unit),
-                                           self.meri.s,
-                                           self.norm.s) + ray.norm.s[-1]
-
-            if not invesselflag and scipy.isfinite(intersect):
-                ray.norm.s = scipy.append(ray.norm.s,intersect)
-        
-            # This is used when the actual plasma vessel structure is not as described in the eqdsk
-            # example being the Limiter on Alcator C-Mod, which then keys to neglect an intersection,
-            # and look for the next as the true wall intersection.
-            for i in range(limiter):
-                intersect = _beam.interceptCyl(scipy.atleast_2d(ray.x()[:,-1]),
-                                               scipy.atleast_2d(ray.norm.unit),
-                                               self.meri.s,
-                                               self.norm.s) + ray.norm.s[-1]
-                if scipy.isfinite(intersect):
-                    ray.norm.s[-1] = intersect                    
-        
+
+            intersect1, intersect2, slast = self._traceArrays(ray.pt0,
+                                                              ray.norm,
+                                                              ray.s[:,-1],
+                                                              limiter)
+            ray._append(intersect1, intersect2)
+            ray.s[:,-1] = slast
+            return
+
+        if not len(rays):
+            return
+
+        # norm vector is modfied following the convention set in geometry.Origin
+        for i in rays:
+            if not i._origin is self:
+                i.redefine(self)
+
+        intersect1, intersect2, slast = self._traceArrays(scipy.array([i.unit*i.s for i in rays]),
+                                                          scipy.array([i.norm.unit for i in rays]),
+                                                          scipy.array([i.norm.s[-1] for i in rays]),
+                                                          limiter)
+
+        for i in range(len(rays)):
+            temp = rays[i].norm.s
+            if scipy.isfinite(intersect1[i]):
+                temp = scipy.append(temp, intersect1[i])
+            if scipy.isfinite(intersect2[i]):
+                temp = scipy.append(temp, intersect2[i])
+            temp[-1] = slast[i]
+            rays[i].norm.s = temp
+
+    def _traceArrays(self, pt0, norm, slast, limiter=0):
+        """ traces rays defined by arrays of cartesian origins and unit
+        directions (N,3) from s = slast. Returns the two intercepts to
+        be appended to the s values of each ray (nan when not appended)
+        and the final value of the last s value of each ray."""
+        s0 = slast
+        limiter = scipy.ones((len(pt0),), dtype=int)*scipy.array(limiter, dtype=int)
+        invesselflag = self._inVessel(pt0 + norm*slast[:,scipy.newaxis])
+
+        intersect1 = self._intercept(pt0, norm, slast)
+        flag1 = scipy.isfinite(intersect1)
+        slast = scipy.where(flag1, intersect1, slast)
+
+        intersect2 = self._intercept(pt0, norm, slast)
+        flag2 = scipy.logical_and(scipy.isfinite(intersect2), ~invesselflag)
+        slast = scipy.where(flag2, intersect2, slast)
+
+        # This is used when the actual plasma vessel structure is not as described in the eqdsk
+        # example being the Limiter on Alcator C-Mod, which then keys to neglect an intersection,
+        # and look for the next as the true wall intersection.
+        for i in range(limiter.max()):
+            intersect = self._intercept(pt0, norm, slast)
+            slast = scipy.where(scipy.logical_and(scipy.isfinite(intersect), limiter > i),
+                                intersect,
+                                slast)
+
+        intersect1 = scipy.where(flag1, intersect1, scipy.nan)
+        intersect2 = scipy.where(flag2, intersect2, scipy.nan)
+
+        if self.wall is not None:
+            # the first intercept with the 3D wall within the vessel
+            # replaces all vessel intercepts which lie beyond it. Rays
+            # starting outside of the vessel are searched from their
+            # entry, such that structures in front of it (the port a
+            # diagnostic views through) are ignored.
+            intersect = self.wall.intercept(pt0,
+                                            norm,
+                                            scipy.where(scipy.logical_and(~invesselflag, flag1),
+                                                        intersect1,
+                                                        s0))
+
+            clip = intersect < slast
+            flag1 = intersect1 < intersect
+            flag2 = scipy.logical_and(flag1, intersect2 < intersect)
+            intersect2 = scipy.where(clip,
+                                     scipy.where(flag2, intersect2, scipy.where(flag1, intersect, scipy.nan)),
+                                     intersect2)
+            intersect1 = scipy.where(clip,
+                                     scipy.where(flag1, intersect1, intersect),
+                                     intersect1)
+            slast = scipy.where(clip, intersect, slast)
+
+        return (intersect1,
+                intersect2,
+                slast)
+
+    def _intercept(self, pt0, norm, s, index=False):
+        """ single kernel call for the next wall intercept of all rays,
+        starting from position s along each ray. If index, the index of
+        the intercepted outline segment (-1 if none) is also returned."""
+        binptr, binidx, zbin = self._wallBins()
+        output, seg = _beam.interceptCylBin(pt0 + norm*s[:,scipy.newaxis],
+                                            norm,
+                                            self.meri.s,
+                                            self.norm.s,
+                                            binptr,
+                                            binidx,
+                                            zbin)
+        if index:
+            return output + s, seg
+        return output + s
+
+    def _wallBins(self):
+        """ acceleration structure of the wall for interceptCylBin, the 
+        segments of the outline binned by their Z range into uniform bins.
+        It is built once, and rebuilt only if the outline is replaced.
+
+        Returns:
+            (binptr, binidx, zbin) tuple of the segment indices
+            binidx[binptr[k]:binptr[k+1]] of bin k, with edges zbin.
+        """
+        r = self.meri.s
+        z = self.norm.s
+        try:
+            if self._bins[0] is r and self._bins[1] is z:
+                return self._bins[2:]
         except AttributeError:
-            for i in ray:
-                self.trace(i, limiter=limiter)
+            pass
+
+        nseg = len(z) - 1
+        nbin = max(int(scipy.sqrt(nseg)), 1)
+        zmin = z.min()
+        zmax = z.max() + (z.max() == z.min())
+        zbin = scipy.linspace(zmin, zmax, nbin + 1)
+
+        # segments are included in every bin which they overlap, padded
+        # for the rounding of the intercept position
+        eps = 1e-9*(abs(zmin) + abs(zmax) + zmax - zmin)
+        width = zbin[1] - zbin[0]
+        lo = scipy.clip(scipy.floor((scipy.minimum(z[:-1], z[1:]) - eps - zmin)/width), 0, nbin - 1).astype(int)
+        hi = scipy.clip(scipy.floor((scipy.maximum(z[:-1], z[1:]) + eps - zmin)/width), 0, nbin - 1).astype(int)
+
+        num = hi - lo + 1
+        seg = scipy.repeat(scipy.arange(nseg), num)
+        idx = scipy.repeat(lo - scipy.cumsum(num) + num, num) + scipy.arange(num.sum())
+        order = scipy.argsort(idx, kind='mergesort')
+
+        binptr = scipy.concatenate(([0], scipy.cumsum(scipy.bincount(idx, minlength=nbin))))
+        self._bins = (r,
+                      z,
+                      binptr.astype(scipy.int32),
+                      seg[order].astype(scipy.int32),
+                      zbin)
+        return self._bins[2:]
+
+    def _wallHit(self, pt0, norm, s):
+        """ next intercept of rays with the vessel outline or the 3D wall,
+        whichever is nearer, starting from position s along each ray, and
+        the (N,3) cartesian unit normal of the wall at the intercept"""
+        output, seg = self._intercept(pt0, norm, s, index=True)
+
+        # normal of the cone generated by the outline segment
+        pts = pt0 + norm*output[:,scipy.newaxis]
+        phi = scipy.arctan2(pts[:,1], pts[:,0])
+        delr = scipy.diff(self.meri.s)[seg]
+        delz = scipy.diff(self.norm.s)[seg]
+        temp = scipy.sqrt(delr**2 + delz**2)
+        normal = scipy.array([delz*scipy.cos(phi)/temp,
+                              delz*scipy.sin(phi)/temp,
+                              -delr/temp]).T
 
-        except ValueError:
-            # for subBeams, reference main beam
-            self.trace(ray.main)
-            #self.norm.s = 
+        if self.wall is not None:
+            intersect, tri = self.wall.intercept(pt0, norm, s, index=True)
+            flag = intersect < output
+            output = scipy.where(flag, intersect, output)
+            normal[flag] = self.wall.normal(tri[flag])
+
+        return output, normal
+
+    def _inVessel(self, pts):
+        """ vectorized form of inVessel for (N,3) array of cartesian points,
+        using the same crossing number test as eqtools.inPolygon"""
+        r = scipy.sqrt(pts[:,0]**2 + pts[:,1]**2)[:,scipy.newaxis]
+        z = pts[:,2][:,scipy.newaxis]
+        r1 = self.sagi.s
+        z1 = self.norm.s
+        r2 = scipy.roll(r1, -1)
+        z2 = scipy.roll(z1, -1)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=RuntimeWarning)
+            cross = scipy.logical_and((z1 > z) != (z2 > z),
+                                      r < (r2 - r1)*(z - z1)/(z2 - z1) + r1)
+
+        return scipy.sum(cross, axis=1) % 2 == 1
 
     def pnt2RhoTheta(self, point,t=0, method = 'psinorm', n=0, poloidal_plane=0):
         """ takes r,theta,z and the plasma, and map it to the toroidal position
@@ -143,9 +364,75 @@ class Tokamak(geometry.Center):
                  + (n*point[1]) + scipy.pi)% (2*scipy.pi) - scipy.pi
         return rho,theta
 
-    def gridWeight(self, beams, rgrid=None, zgrid=None, spacing=1e-3):
-        """ this method finds the weighting of the view on a poloidal plane
-        it takes a beam and traces it through the plasma"""
+    def fluxMap(self, method='psinorm', rgrid=None, zgrid=None, kind='linear', maxsize=64):
+        """Opt-in cached flux coordinate mapping of the equilibrium.
+
+        Returns a FluxMap, which can be used in place of the eqtools
+        rz2psinorm-like methods (for example as the plasmameth of
+        invert.fluxFourierSens).
+
+        Kwargs:
+            method: normalization method (psinorm,phinorm,volnorm)
+                passed to rz2rho.
+
+            rgrid: R grid in meters on which to evaluate the flux, 
+                defaults to the equilibrium R grid.
+
+            zgrid: Z grid in meters on which to evaluate the flux, 
+                defaults to the equilibrium Z grid.
+
+            kind: 'linear' or 'cubic' interpolation of the grid.
+
+            maxsize: number of time slices to store.
+
+        Returns:
+            FluxMap object
+        """
+        return FluxMap(self.eq,
+                       method=method,
+                       rgrid=rgrid,
+                       zgrid=zgrid,
+                       kind=kind,
+                       maxsize=maxsize)
+
+    def gridWeight(self, beams, rgrid=None, zgrid=None, spacing=1e-3, etendue=True, exact=True):
+        """Geometry matrix of traced beams on a poloidal (R,Z) pixel grid
+
+        The pixels are centered on the grid points, with edges halfway
+        between neighbouring points, such that the equilibrium grid can
+        be used as a pixel basis for tomography.
+
+        Args:
+            beams: Beam object, BeamArray or tuple of Beam objects
+                which have been traced through the Tokamak.
+
+        Kwargs:
+            rgrid: R pixel centers in meters, defaults to the 
+                equilibrium R grid.
+
+            zgrid: Z pixel centers in meters, defaults to the 
+                equilibrium Z grid.
+
+            spacing: step size along the beam in meters for the
+                sampled weighting (exact=False).
+
+            etendue: bool
+                If True (default), the weights are the etendue times 
+                the length of each beam in each pixel (meters cubed),
+                otherwise only the length (meters). Beams without
+                etendue then have zero rows.
+
+            exact: bool
+                If True (default), the analytic path length of each beam
+                in each pixel is used, otherwise the beam is sampled
+                every spacing.
+
+        Returns:
+            scipy.sparse CSR matrix of shape (number of beams, 
+            len(rgrid)*len(zgrid)), with pixels ordered with R 
+            as the slowest varying index (as in a (len(rgrid),len(zgrid))
+            array).
+        """
         
         if rgrid is None:
             rgrid = self.eq.getRGrid()
@@ -153,4 +440,599 @@ class Tokamak(geometry.Center):
         if zgrid is None:
             zgrid = self.eq.getZGrid()
 
-        print('not implemented')
+        output = beam.volWeightBeam(beams,
+                                    _pixelEdges(rgrid),
+                                    _pixelEdges(zgrid),
+                                    ds=spacing,
+                                    exact=exact,
+                                    sparse=True)
+
+        if not etendue:
+            # beams without etendue (subBeam segments outside of their
+            # surface) are given zero rows
+            temp = scipy.array([scipy.squeeze(i[3]) for i in beam._beamArrays(beams)])
+            good = temp > 0
+            temp = scipy.where(good, 1./scipy.where(good, temp, 1.), 0.)
+            output = scipy.sparse.diags(temp).dot(output).tocsr()
+
+        return output
+
+    def reflect(self, beams, depth=1, mode='specular', reflectivity=1., samples=1, exponent=1., seed=None):
+        """Traces the wall reflections of traced beams
+
+        The rays of each bounce generation are reflected at their wall 
+        intercept and traced to the next intercept with the vessel (or
+        the 3D wall if it is nearer) as a single batch. The reflections
+        are either specular, or sampled from a lobe about the normal of 
+        the wall for diffuse reflection. The etendue of each reflected
+        ray is weighted such that its sum over the rays of a bounce is
+        the reflected fraction of the etendue of the beam.
+
+        Args:
+            beams: Beam object, BeamArray or tuple of Beam objects
+                which have been traced through the Tokamak.
+
+        Kwargs:
+            depth: number of reflections.
+
+            mode: 'specular' or 'diffuse'.
+
+            reflectivity: fraction of the power reflected at each
+                bounce.
+
+            samples: number of rays sampled for each diffuse 
+                reflection, such that bounce k has samples**k rays
+                per beam.
+
+            exponent: power n of the cos(theta)**n lobe about the wall
+                normal from which diffuse rays are sampled. The default
+                of 1 is a Lambertian wall.
+
+            seed: seed of the random sampling of diffuse rays.
+
+        Returns:
+            list of (BeamArray, index) tuples for each bounce. The rays
+            extend from the reflection (s = 0) to the next wall intercept,
+            and index is the beam (following the flattened order of 
+            beams) from which each ray originates. Beams which do not
+            end on the wall are not reflected.
+        """
+        if not mode in ('specular', 'diffuse'):
+            raise ValueError("mode must be 'specular' or 'diffuse'")
+
+        if isinstance(beams, beam.BeamArray):
+            rays = beams[scipy.arange(len(beams))]
+        else:
+            rays = beam.beams2Array(beams)
+
+        if not rays._origin is self:
+            rays.redefine(self)
+
+        random = scipy.random.RandomState(seed)
+
+        # the surface at the end of each beam is found again from
+        # just before the final intercept
+        s, normal = self._wallHit(rays.pt0, rays.norm, rays.s[:,-1] - 1e-5)
+        good = abs(s - rays.s[:,-1]) < 2e-5
+        index = scipy.arange(len(rays))[good]
+        pt0 = rays.pt0[good] + rays.norm[good]*s[good,scipy.newaxis]
+        norm = rays.norm[good]
+        etendue = rays.etendue[good]
+        normal = normal[good]
+
+        output = []
+        for i in range(depth):
+            # normals are oriented against the incident ray
+            normal *= -scipy.sign(scipy.sum(normal*norm, axis=1))[:,scipy.newaxis]
+
+            if mode == 'specular':
+                norm = norm - 2*scipy.sum(norm*normal, axis=1)[:,scipy.newaxis]*normal
+            else:
+                pt0 = scipy.repeat(pt0, samples, axis=0)
+                index = scipy.repeat(index, samples)
+                etendue = scipy.repeat(etendue, samples)/samples
+                norm = _lobe(scipy.repeat(normal, samples, axis=0), exponent, random)
+
+            etendue = etendue*reflectivity
+            s, normal = self._wallHit(pt0, norm, scipy.zeros((len(pt0),)))
+            good = scipy.isfinite(s)
+
+            output += [(beam.BeamArray(pt0[good],
+                                       norm[good],
+                                       self,
+                                       s=scipy.array([s[good]*0, s[good]]).T,
+                                       etendue=etendue[good]),
+                        index[good])]
+
+            pt0 = pt0[good] + norm[good]*s[good,scipy.newaxis]
+            norm = norm[good]
+            etendue = etendue[good]
+            index = index[good]
+            normal = normal[good]
+
+        return output
+
+    def reflectionWeight(self, beams, rgrid=None, zgrid=None, depth=1, mode='specular', reflectivity=1., samples=1, exponent=1., seed=None, spacing=1e-3, exact=True):
+        """Reflection-augmented geometry matrix of traced beams on a 
+        poloidal (R,Z) pixel grid
+
+        The geometry matrix of gridWeight, to which the weighting of the
+        reflected rays of each bounce (see reflect) is added in the row 
+        of the beam from which they originate. The emission seen by
+        the beams through reflections off the wall is then included
+        in the product with an emissivity.
+
+        Args:
+            beams: Beam object, BeamArray or tuple of Beam objects
+                which have been traced through the Tokamak.
+
+        Kwargs:
+            rgrid: R pixel centers in meters, defaults to the 
+                equilibrium R grid.
+
+            zgrid: Z pixel centers in meters, defaults to the 
+                equilibrium Z grid.
+
+            depth: number of reflections.
+
+            mode: 'specular' or 'diffuse'.
+
+            reflectivity: fraction of the power reflected at each
+                bounce.
+
+            samples: number of rays sampled for each diffuse 
+                reflection.
+
+            exponent: power of the cosine lobe of diffuse reflection.
+
+            seed: seed of the random sampling of diffuse rays.
+
+            spacing: step size along the rays in meters for the
+                sampled weighting (exact=False).
+
+            exact: bool, use the analytic path length of each ray
+                in each pixel.
+
+        Returns:
+            scipy.sparse CSR matrix of shape (number of beams, 
+            len(rgrid)*len(zgrid)), in meters cubed.
+        """
+        if rgrid is None:
+            rgrid = self.eq.getRGrid()
+
+        if zgrid is None:
+            zgrid = self.eq.getZGrid()
+
+        output = self.gridWeight(beams, rgrid, zgrid, spacing=spacing, exact=exact)
+        for rays, index in self.reflect(beams,
+                                        depth=depth,
+                                        mode=mode,
+                                        reflectivity=reflectivity,
+                                        samples=samples,
+                                        exponent=exponent,
+                                        seed=seed):
+            temp = beam.volWeightBeam(rays,
+                                      _pixelEdges(rgrid),
+                                      _pixelEdges(zgrid),
+                                      ds=spacing,
+                                      exact=exact,
+                                      sparse=True)
+
+            # sum of the rows of rays originating from the same beam
+            parent = scipy.sparse.csr_matrix((scipy.ones(index.shape), (index, scipy.arange(len(index)))),
+                                             shape=(output.shape[0], len(index)))
+            output = output + parent.dot(temp)
+
+        return output.tocsr()
+
+
+class FluxMap(object):
+    """Flux coordinate lookup grid of an equilibrium.
+
+    The normalized flux is evaluated through eqtools on a fixed (R,Z)
+    grid once per equilibrium time slice, such that subsequent (R,Z)
+    queries are vectorized interpolations of the stored grid instead of
+    spline evaluations of the equilibrium. Time slices are stored in a
+    least recently used cache.
+
+    Args:
+        equilib: An eqtools Equilibrium object.
+
+    Kwargs:
+        method: normalization method (psinorm,phinorm,volnorm)
+            passed to rz2rho.
+
+        rgrid: R grid in meters on which to evaluate the flux, 
+            defaults to the equilibrium R grid.
+
+        zgrid: Z grid in meters on which to evaluate the flux, 
+            defaults to the equilibrium Z grid.
+
+        kind: 'linear' (bilinear) or 'cubic' (bicubic spline)
+            interpolation of the grid.
+
+        maxsize: number of time slices to store.
+
+    Examples:
+        Use in place of the eqtools method::
+
+            fluxmap = tok.fluxMap('psinorm')
+            sens = invert.fluxFourierSens(beams, fluxmap, tok.center, time, points)
+    """
+
+    def __init__(self, equilib, method='psinorm', rgrid=None, zgrid=None, kind='linear', maxsize=64):
+        
+        if not kind in ('linear', 'cubic'):
+            raise ValueError("kind must be 'linear' or 'cubic'")
+
+        if rgrid is None:
+            rgrid = equilib.getRGrid()
+
+        if zgrid is None:
+            zgrid = equilib.getZGrid()
+
+        self.eq = equilib
+        self.method = method
+        self.rgrid = scipy.asarray(rgrid, dtype=float)
+        self.zgrid = scipy.asarray(zgrid, dtype=float)
+        self.kind = kind
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+
+    def __call__(self, r, z, t):
+        """Interpolates the normalized flux at points (R,Z).
+
+        Args:
+            r: array of R values in meters.
+
+            z: array of Z values in meters, same shape as r.
+
+            t: equilibrium time or array of times.
+
+        Returns:
+            numpy array of shape r.shape, or (len(t),)+r.shape if t
+            is an array, matching the eqtools convention.
+        """
+        r, z = scipy.broadcast_arrays(scipy.asarray(r, dtype=float),
+                                      scipy.asarray(z, dtype=float))
+        shape = r.shape
+        time = scipy.atleast_1d(t)
+
+        # points outside of the grid are given the value at its edge
+        r = scipy.clip(r.ravel(), self.rgrid[0], self.rgrid[-1])
+        z = scipy.clip(z.ravel(), self.zgrid[0], self.zgrid[-1])
+        output = scipy.zeros((len(time), r.size))
+
+        if self.kind == 'linear':
+            # the interpolation weights are independent of time
+            ir, fr = _gridFraction(self.rgrid, r)
+            iz, fz = _gridFraction(self.zgrid, z)
+            for i in range(len(time)):
+                data = self._grid(time[i])
+                output[i] = ((data[iz, ir]*(1 - fr) + data[iz, ir + 1]*fr)*(1 - fz) +
+                             (data[iz + 1, ir]*(1 - fr) + data[iz + 1, ir + 1]*fr)*fz)
+        else:
+            for i in range(len(time)):
+                output[i] = self._grid(time[i]).ev(z, r)
+
+        output = output.reshape((len(time),) + shape)
+        if scipy.ndim(t) == 0:
+            output = output[0]
+        return output
+
+    def _grid(self, t):
+        """ returns the stored grid (or bicubic spline) for time t, 
+        evaluating the equilibrium if it is not in the cache"""
+        key, time = self._slice(t)
+        try:
+            # move to the most recently used position
+            data = self._cache.pop(key)
+        except KeyError:
+            rmesh, zmesh = scipy.meshgrid(self.rgrid, self.zgrid)
+            data = scipy.reshape(self.eq.rz2rho(self.method,
+                                                rmesh.ravel(),
+                                                zmesh.ravel(),
+                                                time),
+                                 rmesh.shape)
+            if self.kind == 'cubic':
+                data = scipy.interpolate.RectBivariateSpline(self.zgrid,
+                                                             self.rgrid,
+                                                             data)
+            while len(self._cache) >= self.maxsize > 0:
+                self._cache.popitem(last=False)
+
+        if self.maxsize > 0:
+            self._cache[key] = data
+        return data
+
+    def _slice(self, t):
+        """ cache key and evaluation time of time t. Without time
+        interpolation of the equilibrium (tspline), eqtools uses the
+        nearest time slice, which is the key, such that all times
+        within a slice share an entry."""
+        if getattr(self.eq, '_tricubic', False):
+            return float(t), float(t)
+
+        try:
+            timebase = scipy.atleast_1d(self.eq.getTimeBase())
+        except AttributeError:
+            return float(t), float(t)
+
+        idx = int(scipy.argmin(abs(timebase - t)))
+        return idx, timebase[idx]
+
+    def clear(self):
+        """ empties the time slice cache"""
+        self._cache.clear()
+
+
+class Wall(object):
+    """Three dimensional first wall as a triangle mesh.
+
+    Describes the toroidally varying structure of the vessel (ports,
+    antennas, limiters) which clips lines of sight at specific toroidal
+    angles. Intercepts are found with the _beam.interceptMesh kernel,
+    which walks each ray through a uniform cartesian grid of cells 
+    listing the triangles which overlap them, such that only the 
+    triangles near the ray are tested.
+
+    Args:
+        vert: (N,3) array of cartesian vertex positions in meters in
+            the Tokamak coordinate system, (R cos(phi), R sin(phi), Z).
+
+        face: (M,3) array of integer vertex indices of each triangle.
+
+    Examples:
+        Vessel with a poloidal limiter between 0.1 and 0.2 radians::
+
+            wall = plasma.wallSection(r, z, num=128)
+            wall += plasma.wallSection(rlim, zlim, (.1, .2), 4, caps=True)
+            tok = plasma.Tokamak(eq, wall=wall)
+    """
+
+    def __init__(self, vert, face):
+        self.vert = scipy.ascontiguousarray(vert, dtype=float).reshape((-1, 3))
+        self.face = scipy.ascontiguousarray(face, dtype=scipy.int32).reshape((-1, 3))
+
+        if self.face.size and (self.face.min() < 0 or self.face.max() >= len(self.vert)):
+            raise ValueError('face indices outside of the vertex array')
+
+    def __len__(self):
+        return len(self.face)
+
+    def __add__(self, wall):
+        """combination of two meshes, x.__add__(y) <==> x+y"""
+        return Wall(scipy.concatenate((self.vert, wall.vert)),
+                    scipy.concatenate((self.face, wall.face + len(self.vert))))
+
+    def intercept(self, pt0, norm, s=None, index=False):
+        """Next intercept of rays with the wall.
+
+        Args:
+            pt0: (N,3) array of cartesian ray origins.
+
+            norm: (N,3) array of cartesian unit directions.
+
+        Kwargs:
+            s: (N,) array of positions along each ray from which to
+                search, defaults to the ray origin.
+
+            index: bool, also return the index of the intercepted
+                triangle (-1 if none).
+
+        Returns:
+            (N,) array of the ray position s of the intercept, inf
+            if the ray does not intercept the wall.
+        """
+        pt0 = scipy.asarray(pt0, dtype=float)
+        norm = scipy.asarray(norm, dtype=float)
+        if s is None:
+            s = scipy.zeros((len(pt0),))
+
+        if not len(self.face):
+            output = s + scipy.inf
+            tri = -scipy.ones(s.shape, dtype=int)
+        else:
+            cellptr, cellidx, lower, width, ncell = self._grid()
+            output, tri = _beam.interceptMesh(pt0 + norm*s[:,scipy.newaxis],
+                                              norm,
+                                              self.vert,
+                                              self.face,
+                                              cellptr,
+                                              cellidx,
+                                              lower,
+                                              width,
+                                              ncell)
+            output = output + s
+
+        if index:
+            return output, tri
+        return output
+
+    def normal(self, tri):
+        """Unit normals of triangles.
+
+        Args:
+            tri: array of triangle indices.
+
+        Returns:
+            (N,3) array of the cartesian unit normals, following the
+            right hand rule of the vertex order of each face.
+        """
+        temp = self.vert[self.face[tri]]
+        output = scipy.cross(temp[:,1] - temp[:,0], temp[:,2] - temp[:,0])
+        return output/scipy.sqrt(scipy.sum(output**2, axis=1))[:,scipy.newaxis]
+
+    def _grid(self):
+        """ acceleration structure of the mesh for interceptMesh, a 
+        uniform grid of about one cell per triangle. The triangles are
+        listed in every cell which their bounding box overlaps. It is 
+        built once, and rebuilt only if the mesh arrays are replaced.
+
+        Returns:
+            (cellptr, cellidx, lower, width, ncell) tuple of the triangle
+            indices cellidx[cellptr[c]:cellptr[c+1]] of cell c, and the
+            lower corner, cell size and number of cells along x, y, z.
+        """
+        try:
+            if self._cells[0] is self.vert and self._cells[1] is self.face:
+                return self._cells[2:]
+        except AttributeError:
+            pass
+
+        tri = self.vert[self.face]
+        tmin = tri.min(axis=1)
+        tmax = tri.max(axis=1)
+
+        # the grid is padded for the rounding of the intercept position
+        eps = 1e-9*(abs(tmin).max() + abs(tmax).max() + (tmax.max(axis=0) - tmin.min(axis=0)).max())
+        lower = tmin.min(axis=0) - 2*eps
+        extent = tmax.max(axis=0) + 2*eps - lower
+        density = (len(tri)/scipy.prod(scipy.maximum(extent, 1e-2*extent.max())))**(1./3)
+        ncell = scipy.clip(scipy.floor(extent*density), 1, 1024).astype(int)
+        width = extent/ncell
+
+        lo = scipy.clip(scipy.floor((tmin - eps - lower)/width), 0, ncell - 1).astype(int)
+        hi = scipy.clip(scipy.floor((tmax + eps - lower)/width), 0, ncell - 1).astype(int)
+        span = hi - lo + 1
+
+        num = scipy.prod(span, axis=1)
+        tri = scipy.repeat(scipy.arange(len(num)), num)
+        local = scipy.arange(num.sum()) - scipy.repeat(scipy.cumsum(num) - num, num)
+        lo = lo[tri]
+        span = span[tri]
+        idx = (((lo[:,0] + local//(span[:,1]*span[:,2]))*ncell[1] +
+                lo[:,1] + (local//span[:,2]) % span[:,1])*ncell[2] +
+               lo[:,2] + local % span[:,2])
+        order = scipy.argsort(idx, kind='mergesort')
+
+        cellptr = scipy.concatenate(([0], scipy.cumsum(scipy.bincount(idx, minlength=scipy.prod(ncell)))))
+        self._cells = (self.vert,
+                       self.face,
+                       cellptr.astype(scipy.int32),
+                       tri[order].astype(scipy.int32),
+                       lower,
+                       width,
+                       ncell.astype(scipy.int32))
+        return self._cells[2:]
+
+
+def wallSection(r, z, phi=(0., 2*scipy.pi), num=64, caps=False):
+    """Triangle mesh of a poloidal outline revolved between two toroidal angles
+
+    The surface is faceted with num steps in toroidal angle, such that
+    a chord of the revolved surface deviates by at most 
+    R*(1-cos(dphi/2)) from it. A full revolution is closed without a
+    seam.
+
+    Args:
+        r: array of R values in meters of the outline.
+
+        z: array of Z values in meters of the outline.
+
+    Kwargs:
+        phi: (start, stop) toroidal angles in radians.
+
+        num: number of toroidal facets.
+
+        caps: boolean, close the ends of the section with the polygon
+            of the outline, as for limiters and antennas which are 
+            solid between the toroidal angles.
+
+    Returns:
+        Wall object
+    """
+    r = scipy.asarray(r, dtype=float)
+    z = scipy.asarray(z, dtype=float)
+    npts = len(r)
+    full = abs(phi[1] - phi[0]) >= 2*scipy.pi*(1 - 1e-12)
+
+    angle = scipy.linspace(phi[0], phi[1], num + 1)
+    if full:
+        angle = angle[:-1]
+    nang = len(angle)
+
+    vert = scipy.array([scipy.outer(scipy.cos(angle), r).ravel(),
+                        scipy.outer(scipy.sin(angle), r).ravel(),
+                        scipy.tile(z, nang)]).T
+
+    # quadrilateral (i,k), (i+1,k), (i+1,k+1), (i,k+1) of each facet
+    i, k = scipy.meshgrid(scipy.arange(num), scipy.arange(npts - 1), indexing='ij')
+    p00 = i*npts + k
+    p10 = ((i + 1) % nang)*npts + k
+    face = scipy.concatenate((scipy.array([p00, p10, p10 + 1]).reshape((3, -1)).T,
+                              scipy.array([p00, p10 + 1, p00 + 1]).reshape((3, -1)).T))
+
+    if caps and not full:
+        cap = _earClip(r, z)
+        face = scipy.concatenate((face, cap, cap + (nang - 1)*npts))
+
+    return Wall(vert, face)
+
+
+def _earClip(r, z):
+    """ triangulation of a simple polygon (R,Z) by ear clipping, returns
+    the (M,3) array of point indices of each triangle"""
+    idx = list(range(len(r)))
+    if len(idx) > 1 and r[0] == r[-1] and z[0] == z[-1]:
+        idx = idx[:-1]
+
+    # orientation of the polygon from its signed area
+    orient = scipy.sign(scipy.sum(r[idx]*scipy.roll(z[idx], -1) - scipy.roll(r[idx], -1)*z[idx]))
+    output = []
+
+    while len(idx) > 3:
+        for i in range(len(idx)):
+            a, b, c = idx[i - 1], idx[i], idx[(i + 1) % len(idx)]
+            cross = orient*((r[b] - r[a])*(z[c] - z[a]) - (z[b] - z[a])*(r[c] - r[a]))
+            if cross < 0:
+                continue
+
+            # an ear contains none of the remaining points
+            other = scipy.array([j for j in idx if not j in (a, b, c)])
+            inside = scipy.ones(other.shape, dtype=bool)
+            for p, q in ((a, b), (b, c), (c, a)):
+                inside &= orient*((r[q] - r[p])*(z[other] - z[p]) - (z[q] - z[p])*(r[other] - r[p])) >= 0
+            if cross == 0 or not inside.any():
+                output += [(a, b, c)]
+                del idx[i]
+                break
+        else:
+            raise ValueError('outline is not a simple polygon')
+
+    if len(idx) == 3:
+        output += [tuple(idx)]
+    return scipy.array(output, dtype=int).reshape((-1, 3))
+
+
+def _lobe(normal, exponent, random):
+    """ random unit vectors sampled from the cos(theta)**exponent 
+    distribution about the (N,3) unit vectors normal"""
+    temp = random.uniform(size=(2, len(normal)))
+    cost = temp[0]**(1./(exponent + 1))
+    sint = scipy.sqrt(1 - cost**2)
+    phi = 2*scipy.pi*temp[1]
+
+    # orthonormal basis perpendicular to normal
+    vec1 = scipy.cross(normal, scipy.where(abs(normal[:,:1]) < .9, [[1., 0., 0.]], [[0., 1., 0.]]))
+    vec1 /= scipy.sqrt(scipy.sum(vec1**2, axis=1))[:,scipy.newaxis]
+    vec2 = scipy.cross(normal, vec1)
+
+    return (cost[:,scipy.newaxis]*normal +
+            (sint*scipy.cos(phi))[:,scipy.newaxis]*vec1 +
+            (sint*scipy.sin(phi))[:,scipy.newaxis]*vec2)
+
+def _gridFraction(grid, pts):
+    """ lower index of the grid cell containing pts and the fractional
+    position within it"""
+    idx = scipy.clip(scipy.searchsorted(grid, pts) - 1, 0, len(grid) - 2)
+    frac = (pts - grid[idx])/(grid[idx + 1] - grid[idx])
+    return idx, frac
+
+
+def _pixelEdges(grid):
+    """ pixel edges halfway between the points of a grid"""
+    grid = scipy.asarray(grid, dtype=float)
+    return scipy.concatenate(([1.5*grid[0] - .5*grid[1]],
+                              (grid[1:] + grid[:-1])/2,
+                              [1.5*grid[-1] - .5*grid[-2]]))
@@ -130,12 +130,13 @@ class Surf(geometry.Origin):
         """Solves for intersection point of surface and a ray or Beam
     
         Args:
-            ray: Ray or Beam object
+            ray: Ray, Beam or BeamArray object
                 It must be in the same coordinate space as the surface object.
             
         Returns:
-            s: value of s [meters] which intercepts along norm, otherwise an
-            empty tuple (for no intersection).
+            s: value of s [meters] which intercepts along norm, otherwise 
+            None (for no intersection). For a BeamArray, the (s, hit) 
+            tuple of arrays of interceptArray.
         
         Examples:
             Accepts all point and point-derived object inputs, though all data 
@@ -150,22 +151,64 @@ class Surf(geometry.Origin):
         """
         if self._origin is ray._origin:
             try:
+                # BeamArray objects are intercepted as a whole
+                return self.interceptArray(ray.pt0, ray.norm)
+            except AttributeError:
+                pass
 
-                params = scipy.dot(scipy.linalg.inv(scipy.array([ray.norm.unit,
-                                                                 self.meri.unit,
-                                                                 self.sagi.unit]).T),
-                                   (ray-self).x())
-
-                if self.edgetest(params[2],params[1]):
-                    return params[0]
-                else:
-                    return None
-
+            try:
+                s, hit = self.interceptArray(ray.unit*ray.s, ray.norm.unit)
             except AttributeError:
                 raise ValueError('not a surface object')
+
+            if hit[0]:
+                return s[0]
+            else:
+                return None
         else:           
             raise ValueError('not in same coordinate system, use redefine and try again')
 
+    def interceptArray(self, pt0, norm):
+        """Solves for the intersection points of the surface and many rays
+
+        The plane of the surface is intercepted by all rays at once, 
+        and the position of each intercept in the (sagi, meri) basis
+        of the surface is tested against its edge.
+
+        Args:
+            pt0: Array-like of shape (N,3)
+                Cartesian ray origins in meters, in the coordinate 
+                system of the surface object (its _origin).
+
+            norm: Array-like of shape (N,3)
+                Cartesian unit directions of the rays.
+
+        Returns:
+            (s, hit) tuple of arrays of shape (N,), the value of s 
+            [meters] along each ray of the intercept with the plane
+            of the surface (nan if parallel) and the boolean mask of
+            the intercepts within the edge of the surface.
+
+        Examples:
+            Fraction of 10^4 rays from a point which pass an aperture::
+
+                    s, hit = aperture.interceptArray(scipy.tile(pt0, (10000, 1)),
+                                                     norm)
+                    frac = hit.mean()
+        """
+        pt0 = scipy.atleast_2d(pt0)
+        norm = scipy.atleast_2d(norm)
+        temp = pt0 - self.x()
+
+        with scipy.errstate(divide='ignore', invalid='ignore'):
+            s = -scipy.dot(temp, self.norm.unit)/scipy.dot(norm, self.norm.unit)
+
+        temp = temp + norm*s[:,scipy.newaxis]
+        hit = scipy.logical_and(scipy.isfinite(s),
+                                self.edgetest(scipy.dot(temp, self.sagi.unit),
+                                              scipy.dot(temp, self.meri.unit)))
+        return s, hit
+
 class Rect(Surf):
     """Origin object with inherent cartesian backend mathematics.
      
@@ -269,46 +312,62 @@ class Rect(Surf):
                               self._origin)
 
     def edgetest(self, sagi, meri):
+        """ boolean array of the (sagi, meri) positions within the surface"""
+        return scipy.logical_and(abs(meri) <= self.meri.s,
+                                 abs(sagi) <= self.sagi.s)
 
-        if abs(meri) <= self.meri.s and abs(sagi) <= self.sagi.s:
-            return True
-        else:
-            return False
+    def sample(self, u, v):
+        """Maps points of the unit square uniformly onto the surface
+
+        Args:
+            u: array of values in [0,1] along the sagittal direction.
+
+            v: array of values in [0,1] along the meridonial direction.
+
+        Returns:
+            Tuple of the cartesian points on the surface (shape
+            (N,3)), their unit normals and the total surface area.
+        """
+        pts = (self.x() +
+               ((2*scipy.atleast_1d(u) - 1)*self.sagi.s)[:,scipy.newaxis]*self.sagi.unit +
+               ((2*scipy.atleast_1d(v) - 1)*self.meri.s)[:,scipy.newaxis]*self.meri.unit)
+        return pts, scipy.tile(self.norm.unit, (len(pts), 1)), self.area()
 
     def split(self, sagi, meri):
-        """ utilizes geometry.grid to change the rectangle into a generalized surface,
-        it is specified with a single set of basis vectors to describe the meridonial,
-        normal, and sagittal planes."""
-        ins = old_div(float((sagi - 1)),sagi)
-        inm = old_div(float((meri - 1)),meri)
+        """Splits the rectangle into sagi by meri rectangles of equal size
+
+        Args:
+            sagi: number of rectangles in the sagittal direction.
+
+            meri: number of rectangles in the meridonial direction.
+
+        Returns:
+            SurfaceArray of Rect of shape (meri, sagi), which share
+            the basis vectors of the rectangle.
+        """
         stemp = old_div(self.sagi.s,sagi)
         mtemp = old_div(self.meri.s,meri)
 
-        self.sagi.s,self.meri.s = scipy.meshgrid(scipy.linspace(-self.sagi.s*ins,
-                                                                 self.sagi.s*ins,
-                                                                 sagi),
-                                                 scipy.linspace(-self.meri.s*inm,
-                                                                 self.meri.s*inm,
-                                                                 meri))
-
-        x_hat = self + (self.sagi + self.meri) #creates a vector which includes all the centers of the subsurface
-        self.sagi.s = stemp*sagi #returns values to previous numbers
-        self.meri.s = mtemp*meri
-
-        print(x_hat.x().shape)
-
-        temp = Rect(x_hat,
-                    self._origin,
-                    [2*stemp,2*mtemp],
-                    vec=[self.meri.copy(), self.norm.copy()],
-                    flag=self.flag)
-        #return temp
-
-        return super(Rect, temp).split(temp._origin,
-                                       [2*stemp,2*mtemp],
-                                       vec=[temp.meri,temp.norm],
-                                       flag=temp.flag,
-                                       obj=type(temp))
+        # centers of the subsurfaces
+        s, m = scipy.meshgrid(stemp*(2*scipy.arange(sagi) - sagi + 1),
+                              mtemp*(2*scipy.arange(meri) - meri + 1))
+        pt0 = (self.x() +
+               s[...,scipy.newaxis]*self.sagi.unit +
+               m[...,scipy.newaxis]*self.meri.unit)
+
+        length = scipy.ones(s.shape + (3,))
+        length[...,0] = stemp
+        length[...,1] = mtemp
+        length[...,2] = self.norm.s
+
+        return SurfaceArray(type(self),
+                            pt0,
+                            self._origin,
+                            self.meri.unit,
+                            self.norm.unit,
+                            length=length,
+                            flag=self.flag)
+
 """
 class Parabola(Surf):
 """
@@ -479,6 +538,47 @@ class Cyl(Surf):
         else:           
             raise ValueError('not in same coordinate system, use redefine and try again')
 
+    def interceptArray(self, pt0, norm):
+        """Solves for the intersection points of the cylinder and many rays
+
+        Args:
+            pt0: Array-like of shape (N,3)
+                Cartesian ray origins in meters, in the coordinate 
+                system of the surface object (its _origin).
+
+            norm: Array-like of shape (N,3)
+                Cartesian unit directions of the rays.
+
+        Returns:
+            (s, hit) tuple of arrays of shape (N,), the value of s 
+            [meters] along each ray of the first intercept within the
+            angular extent of the cylinder (nan if none) and the 
+            boolean mask of the rays which intercept it.
+        """
+        # rays in the cartesian coordinates of the cylinder, from the
+        # current basis (_rot is relative to the construction origin)
+        rot = scipy.array([self.sagi.unit, self.meri.unit, self.norm.unit]).T
+        pt0 = scipy.dot(scipy.atleast_2d(pt0) - self.x(), rot)
+        norm = scipy.dot(scipy.atleast_2d(norm), rot)
+
+        output = scipy.nan*scipy.zeros((len(pt0),))
+        s = scipy.zeros((len(pt0),))
+        # a line intercepts the cylinder at most twice
+        for i in range(2):
+            s = _beam.interceptCyl(pt0 + norm*s[:,scipy.newaxis],
+                                   norm,
+                                   scipy.array([self.sagi.s, self.sagi.s]).ravel(),
+                                   scipy.array([-self.norm.s, self.norm.s]).ravel()) + s
+            good = scipy.isfinite(s)
+            s[~good] = 0.
+
+            temp = pt0 + norm*s[:,scipy.newaxis]
+            flag = scipy.logical_and(scipy.logical_and(good, scipy.isnan(output)),
+                                     self.edgetest(self.sagi.s, scipy.arctan2(temp[:,1], temp[:,0])))
+            output[flag] = s[flag]
+
+        return output, scipy.isfinite(output)
+
     def edge(self, pts=20):
 
         if pts%2 == 1:
@@ -508,130 +608,105 @@ class Cyl(Surf):
 
 
     def split(self, sagi, meri):
-        """ utilizes geometry.grid to change the rectangle into a generalized surface,
-        it is specified with a single set of basis vectors to describe the meridonial,
-        normal, and sagittal planes."""
-        ins = old_div(float((sagi - 1)),sagi)
-        inm = old_div(float((meri - 1)),meri)
+        """Splits the cylinder into sagi by meri cylinders of equal size
+
+        Args:
+            sagi: number of cylinders along the axis (norm) of the 
+                cylinder.
+
+            meri: number of cylinders in angle.
+
+        Returns:
+            SurfaceArray of Cyl of shape (meri, sagi). Each cylinder
+            is centered on the axis, with its sagittal vector rotated
+            to the center angle of its section.
+        """
         stemp = old_div(self.norm.s,sagi)
         mtemp = old_div(self.meri.s,meri)
+        z, radial, tangent = self._grid(sagi, meri)
 
-        z,theta = scipy.meshgrid(scipy.linspace(-self.norm.s*ins,
-                                                self.norm.s*ins,
-                                                sagi),
-                                 scipy.linspace(-self.meri.s*inm,
-                                                self.meri.s*inm,
-                                                meri))
-
-        vecin =geometry.Vecr((self.sagi.s*scipy.ones(theta.shape),
-                              theta+old_div(scipy.pi,2),
-                              scipy.zeros(theta.shape))) #this produces an artificial
-        # meri vector, which is in the 'y_hat' direction in the space of the cylinder
-        # This is a definite patch over the larger problem, where norm is not normal
-        # to the cylinder surface, but is instead the axis of rotation.  This was
-        # done to match the Vecr input, which works better with norm in the z direction
-               
-        pt1 = geometry.Point(geometry.Vecr((scipy.zeros(theta.shape),
-                                            theta,
-                                            z)),
-                             self)
+        length = scipy.ones(z.shape + (3,))
+        length[...,0] = self.sagi.s
+        length[...,1] = mtemp
+        length[...,2] = stemp
 
-        pt1.redefine(self._origin)
+        return SurfaceArray(type(self),
+                            self.x() + z[...,scipy.newaxis]*self.norm.unit,
+                            self._origin,
+                            tangent,
+                            self.norm.unit,
+                            length=length,
+                            flag=self.flag)
 
-        vecin = vecin.split()
+    def sample(self, u, v):
+        """Maps points of the unit square uniformly onto the surface
 
-        x_hat = self + pt1 #creates a vector which includes all the centers of the subsurface
+        Args:
+            u: array of values in [0,1] in angle.
 
-        out = []
-        #this for loop makes me cringe super hard
-        for i in range(meri):
-            try:
-                temp = []
-                for j in range(sagi):
-                    inp = self.rot(vecin[i][j])
-                    temp += [Cyl(geometry.Vecx(x_hat.x()[:,i,j]),
-                                 self._origin,
-                                 [2*stemp,2*mtemp],
-                                 self.sagi.s,
-                                 vec=[inp, self.norm.copy()],
-                                 flag=self.flag)]
-                out += [temp]
-            except IndexError:
-                inp = self.rot(vecin[i])
-                out += [Cyl(geometry.Vecx(x_hat.x()[:,i]),
-                            self._origin,
-                            [2*stemp,2*mtemp],
-                            self.norm.s,
-                            vec=[inp, self.norm.copy()],
-                            flag=self.flag)]
-                
+            v: array of values in [0,1] along the axis (norm).
 
-        return out
-                       
+        Returns:
+            Tuple of the cartesian points on the surface (shape
+            (N,3)), their unit (radial) normals and the total surface
+            area.
+        """
+        theta = ((2*scipy.atleast_1d(u) - 1)*self.meri.s)[:,scipy.newaxis]
+        z = ((2*scipy.atleast_1d(v) - 1)*self.norm.s)[:,scipy.newaxis]
+        radial = scipy.cos(theta)*self.sagi.unit + scipy.sin(theta)*self.meri.unit
+        pts = self.x() + self.sagi.s*radial + z*self.norm.unit
+        return pts, radial, 4*self.sagi.s*self.meri.s*self.norm.s
 
     def edgetest(self, radius, angle):
-
-        if abs(angle) <= self.meri.s:
-            return True
-        else:
-            return False          
+        """ boolean array of the angles within the surface"""
+        return abs(angle) <= self.meri.s
     
     def pixelate(self, sagi, meri):
-        """ convert surface into number of rectangular surfaces"""
-        ins = old_div(float((sagi - 1)),sagi)
-        inm = old_div(float((meri - 1)),meri)
-        stemp = old_div(self.norm.s,sagi)
-        mtemp = old_div(self.meri.s,meri)
+        """Converts the cylinder into sagi by meri rectangular surfaces
 
-        z,theta = scipy.meshgrid(scipy.linspace(-self.norm.s*ins,
-                                                self.norm.s*ins,
-                                                sagi),
-                                 scipy.linspace(-self.meri.s*inm,
-                                                self.meri.s*inm,
-                                                meri))
-
-        vecin = geometry.Vecr((self.sagi.s*scipy.ones(theta.shape),
-                               theta+old_div(scipy.pi,2),
-                               scipy.zeros(theta.shape))) #this produces an artificial
-        # meri vector, which is in the 'y_hat' direction in the space of the cylinder
-        # This is a definite patch over the larger problem, where norm is not normal
-        # to the cylinder surface, but is instead the axis of rotation.  This was
-        # done to match the Vecr input, which works better with norm in the z direction
-               
-        pt1 = geometry.Point(geometry.Vecr((self.sagi.s*scipy.ones(theta.shape),
-                                            theta,
-                                            z)),
-                             self)
+        Args:
+            sagi: number of rectangles along the axis (norm) of the 
+                cylinder.
 
-        pt1.redefine(self._origin)
-                
-        vecin = vecin.split()
+            meri: number of rectangles in angle.
 
-        x_hat = self + pt1 #creates a vector which includes all the centers of the subsurface
+        Returns:
+            SurfaceArray of Rect of shape (meri, sagi), tangent to the
+            cylinder at the center of each section.
+        """
+        stemp = old_div(self.norm.s,sagi)
+        mtemp = old_div(self.meri.s,meri)
+        z, radial, tangent = self._grid(sagi, meri)
 
-        out = []
-        #this for loop makes me cringe super hard
-        for i in range(meri):
-            try:
-                temp = []
-                for j in range(sagi):
-                    inp = self.rot(vecin[i][j])
-                    temp += [Rect(geometry.Vecx(x_hat.x()[:,i,j]),
-                                  self._origin,
-                                  [2*stemp,2*scipy.tan(mtemp)*self.sagi.s],
-                                  vec=[inp, self.sagi.copy()],
-                                  flag=self.flag)]
-                out += [temp]
-            except IndexError:
-                inp = self.rot(vecin[i])
-                out += [Rect(geometry.Vecx(x_hat.x()[:,i]),
-                             self._origin,
-                             [2*stemp,2*scipy.tan(mtemp)*self.sagi.s],
-                             vec=[inp, self.sagi.copy()],
-                             flag=self.flag)]
+        length = scipy.ones(z.shape + (3,))
+        length[...,0] = stemp
+        length[...,1] = scipy.tan(mtemp)*self.sagi.s
+
+        return SurfaceArray(Rect,
+                            (self.x() +
+                             z[...,scipy.newaxis]*self.norm.unit +
+                             self.sagi.s*radial),
+                            self._origin,
+                            tangent,
+                            radial,
+                            length=length,
+                            flag=self.flag)
+
+    def _grid(self, sagi, meri):
+        """ axial position of the centers of sagi by meri sections of
+        the cylinder, as an array of shape (meri, sagi), and the 
+        cartesian radial and tangential unit vectors at each"""
+        stemp = old_div(self.norm.s,sagi)
+        mtemp = old_div(self.meri.s,meri)
 
+        z, theta = scipy.meshgrid(stemp*(2*scipy.arange(sagi) - sagi + 1),
+                                  mtemp*(2*scipy.arange(meri) - meri + 1))
 
-        return out
+        cos = scipy.cos(theta)[...,scipy.newaxis]
+        sin = scipy.sin(theta)[...,scipy.newaxis]
+        radial = cos*self.sagi.unit + sin*self.meri.unit
+        tangent = cos*self.meri.unit - sin*self.sagi.unit
+        return z, radial, tangent
 
 
 
@@ -751,11 +826,28 @@ class Ellipse(Surf):
 
         return scipy.pi*sagi*meri
 
-    def edgetest(self, meri, sagi):
-        if (old_div(meri,self.meri))**2+(old_div(sagi,self.sagi))**2 <= 1:
-            return True
-        else:
-            return False
+    def edgetest(self, sagi, meri):
+        """ boolean array of the (sagi, meri) positions within the surface"""
+        return (sagi/self.sagi.s)**2 + (meri/self.meri.s)**2 <= 1
+
+    def sample(self, u, v):
+        """Maps points of the unit square uniformly onto the surface
+
+        Args:
+            u: array of values in [0,1] setting the radius.
+
+            v: array of values in [0,1] setting the angle.
+
+        Returns:
+            Tuple of the cartesian points on the surface (shape
+            (N,3)), their unit normals and the total surface area.
+        """
+        radius = scipy.sqrt(scipy.atleast_1d(u))[:,scipy.newaxis]
+        theta = 2*scipy.pi*scipy.atleast_1d(v)[:,scipy.newaxis]
+        pts = (self.x() +
+               radius*scipy.cos(theta)*self.sagi.s*self.sagi.unit +
+               radius*scipy.sin(theta)*self.meri.s*self.meri.unit)
+        return pts, scipy.tile(self.norm.unit, (len(pts), 1)), self.area()
 
 class Circle(Ellipse):
     """Origin object with inherent cartesian backend mathematics.
@@ -859,8 +951,137 @@ class Circle(Ellipse):
 
         return super(Circle, self).area(radius, radius2)
 
-    def edgetest(self, radius=None):
-        if radius is None:
-            radius = self.sagi.s
+    def edgetest(self, sagi, meri):
+        """ boolean array of the (sagi, meri) positions within the surface"""
+        return sagi**2 + meri**2 <= self.sagi.s**2
+
+
+
+class SurfaceArray(object):
+    r"""Array-backed collection of surfaces of a single type
 
-        return super(Circle, self).edgetest(radius, 0)
+    Stores the centers, basis vectors and lengths of many surfaces as
+    arrays in a single coordinate system, such as the subsurfaces 
+    generated by Rect.split, Cyl.split and Cyl.pixelate. Surface
+    objects are only generated when an element is accessed. Indexing
+    follows the nested lists of surfaces of the same shape: an integer
+    index of a multidimensional SurfaceArray returns a SurfaceArray of
+    the remaining dimensions (and iteration yields these), while the
+    index of a single element returns a surface object of type obj.
+
+    Args:
+        obj: Surf-derived class
+            Type of the surface objects.
+
+        pt0: Array-like of shape (...,3)
+            Cartesian positions of the surface centers in meters.
+
+        ref: Origin or Origin-derived object
+            Coordinate system in which pt0 and the vectors are defined.
+
+        meri: Array-like of shape (3,) or (...,3)
+            Cartesian meridonial unit vectors, shared by all surfaces
+            if of shape (3,).
+
+        norm: Array-like of shape (3,) or (...,3)
+            Cartesian normal unit vectors, shared by all surfaces if
+            of shape (3,). The sagittal vectors follow from the cross
+            product as for geometry.Origin.
+
+    Kwargs:
+        length: Array-like of shape (...,3)
+            lengths of the sagi, meri and norm vectors of each surface,
+            (the half-widths of a Rect, or the radius, half-angle and 
+            half-length of a Cyl). Defaults to ones.
+
+        flag: Boolean.
+            Sets the default coordinate nature of the generated surface
+            objects, inherited from ref if not specified.
+
+    Examples:
+        Split a detector into 100x100 pixels and generate the beams
+        through an aperture::
+
+                pixels = det.split(100, 100)
+                beams = beam.multiBeam(pixels, aperture)
+
+    """
+
+    def __init__(self, obj, pt0, ref, meri, norm, length=None, flag=None):
+        """
+        """
+        self.obj = obj
+        self.pt0 = scipy.array(pt0, dtype=float)
+        self.meri = scipy.array(meri, dtype=float)
+        self.norm = scipy.array(norm, dtype=float)
+        self.sagi = scipy.cross(self.meri, self.norm)
+
+        if length is None:
+            length = scipy.ones(self.pt0.shape)
+        self.length = scipy.array(length, dtype=float)*scipy.ones(self.pt0.shape)
+
+        self._origin = ref
+        self._depth = ref._depth + 1
+        if flag is None:
+            flag = ref.flag
+        self.flag = flag
+
+    @property
+    def shape(self):
+        return self.pt0.shape[:-1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        if self.pt0[idx].ndim == 1:
+            return self._surf(idx)
+
+        return SurfaceArray(self.obj,
+                            self.pt0[idx],
+                            self._origin,
+                            _index(self.meri, idx),
+                            _index(self.norm, idx),
+                            length=self.length[idx],
+                            flag=self.flag)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _surf(self, idx):
+        """ generates surface object of element idx"""
+        output = self.obj.__new__(self.obj)
+        geometry.Origin.__init__(output,
+                                 geometry.Vecx(self.pt0[idx]),
+                                 self._origin,
+                                 vec=[geometry.Vecx(_index(self.meri, idx)),
+                                      geometry.Vecx(_index(self.norm, idx))],
+                                 flag=self.flag)
+
+        output.sagi.s = scipy.atleast_1d(self.length[idx][0])
+        output.meri.s = scipy.atleast_1d(self.length[idx][1])
+        output.norm.s = scipy.atleast_1d(self.length[idx][2])
+        return output
+
+    def redefine(self, neworigin):
+        """redefine SurfaceArray into new coordinate system
+
+        Args:
+            neworigin: Origin or Origin-derived object
+        """
+        trans = scipy.dot(neworigin._fromCenter(), self._origin._toCenter())
+        self.pt0 = scipy.dot(self.pt0, trans[:3,:3].T) + trans[:3,3]
+        self.sagi = scipy.dot(self.sagi, trans[:3,:3].T)
+        self.meri = scipy.dot(self.meri, trans[:3,:3].T)
+        self.norm = scipy.dot(self.norm, trans[:3,:3].T)
+        self._origin = neworigin
+        self._depth = neworigin._depth + 1
+
+
+def _index(vec, idx):
+    """ element idx of an array of vectors of shape (...,3), or the 
+    vector itself if shared (of shape (3,))"""
+    if vec.ndim == 1:
+        return vec
+    return vec[idx]
@@ -0,0 +1,45 @@
+import scipy
+import TRIPPy.beam as beam
+import TRIPPy.geometry as geometry
+import TRIPPy.invert as invert
+import TRIPPy.plasma as plasma
+import TRIPPy.surface as surface
+
+
+class _Equilibrium(object):
+    """ minimal equilibrium with an elliptical vessel outline"""
+
+    def getMachineCrossSection(self):
+        theta = scipy.linspace(0, 2*scipy.pi, 41)
+        return .7 + .25*scipy.cos(theta), .4*scipy.sin(theta)
+
+
+def test_split_circle_aperture():
+    # segments of a split Circle outside of the circle have no etendue,
+    # and must not enter the inversion
+    vessel = plasma.Tokamak(_Equilibrium())
+    diode = surface.Rect((1.2, 0., .05),
+                         vessel,
+                         [2e-3, 2e-3],
+                         vec=[geometry.Vecx((0., 0., 1.)), geometry.Vecx((-1., 0., 0.))])
+    aperture = surface.Circle((1.1, 0., .05),
+                              vessel,
+                              1e-3,
+                              vec=[geometry.Vecx((0., 0., 1.)), geometry.Vecx((-1., 0., 0.))])
+    beams = beam.subBeam(diode, aperture, [1, 1], [4, 4])
+    vessel.trace(beams)
+    rgrid = scipy.linspace(.5, .9, 9)
+    zgrid = scipy.linspace(-.2, .2, 9)
+
+    sens = vessel.gridWeight(beams, rgrid=rgrid, zgrid=zgrid, etendue=False)
+    good = beams.etendue.ravel() > 0
+    assert (~good).sum() == 4
+    assert scipy.isfinite(sens.toarray()).all()
+    assert not sens.toarray()[~good].any()
+
+    bright = scipy.random.RandomState(0).rand(len(good))
+    output = invert.pixelInvert(beams, bright, vessel, rgrid=rgrid, zgrid=zgrid, smooth=1e-3)
+    flat = beam.beams2Array(beam._flatten(beams))[good]
+    check = invert.pixelInvert(flat, bright[good], vessel, rgrid=rgrid, zgrid=zgrid, smooth=1e-3)
+    assert scipy.isfinite(output).all()
+    assert scipy.allclose(output, check)
@@ -0,0 +1,49 @@
+import scipy
+import TRIPPy.plasma as plasma
+import TRIPPy.XTOMO as XTOMO
+
+
+class _Equilibrium(object):
+    """ minimal equilibrium with an elliptical vessel outline"""
+
+    def getMachineCrossSection(self):
+        theta = scipy.linspace(0, 2*scipy.pi, 41)
+        return .7 + .25*scipy.cos(theta), .4*scipy.sin(theta)
+
+
+def test_wallSection_of_outline_keeps_trace():
+    # chords starting outside of the vessel must stop at the wall
+    # leaving the vessel, not at the wall on the way in
+    eq = _Equilibrium()
+    r, z = eq.getMachineCrossSection()
+    vessel = plasma.Tokamak(eq)
+    walled = plasma.Tokamak(eq, wall=plasma.wallSection(r, z, num=128))
+
+    for i, j in zip(XTOMO.XTOMO1beam(vessel), XTOMO.XTOMO1beam(walled)):
+        assert i.norm.s.shape == j.norm.s.shape
+        assert scipy.allclose(i.norm.s, j.norm.s, atol=1e-6)
+
+
+def test_partial_wall_stops_at_front_face():
+    # an antenna block, which does not enclose the vessel, stops the
+    # chords crossing it where they first reach it
+    eq = _Equilibrium()
+    vessel = plasma.Tokamak(eq)
+    walled = plasma.Tokamak(eq, wall=plasma.wallSection([.85, .93, .93, .85, .85],
+                                                        [-.1, -.1, .1, .1, -.1],
+                                                        phi=(-.2, .2),
+                                                        num=4,
+                                                        caps=True))
+    hits = 0
+    for i, j in zip(XTOMO.XTOMO1beam(vessel), XTOMO.XTOMO1beam(walled)):
+        s = scipy.linspace(i.norm.s[-2], i.norm.s[-1], 100001)
+        pts = i(s).x()
+        r = scipy.sqrt(pts[0]**2 + pts[1]**2)
+        inside = (r >= .85) & (r <= .93) & (abs(pts[2]) <= .1)
+        if inside.any():
+            hits += 1
+            assert abs(j.norm.s[-1] - s[inside.argmax()]) < 1e-5
+        else:
+            assert scipy.allclose(i.norm.s, j.norm.s)
+
+    assert hits > 0